@@ -13,10 +13,12 @@ setup(
         'networkx',
         'web3',
         'numpy',
+        'pyarrow',
         'scipy',
         'py-etherscan-api',
         'eth_abi',
         'google-cloud-storage',
-        'mysqlclient'
+        'mysqlclient',
+        'zstandard'
     ],
 )
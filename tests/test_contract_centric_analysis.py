@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from transaction_trace.analysis import ContractCentricAnalysis, PreProcess, SubtraceBuilder
+from transaction_trace.local import LocalContractTransactions
+from transaction_trace.local.ethereum_database import db_filename
+from transaction_trace.local.single_database import SingleTokenTransferDatabase, SingleTraceDatabase
+
+DATE = "2018-01-01"
+CALLER = "0x" + "11" * 20
+CONTRACT = "0x" + "22" * 20
+
+
+def tx_hash(block_number):
+    return "0x%064x" % block_number
+
+
+def block_traces(block_number):
+    return [(tx_hash(block_number), 0, CALLER, CONTRACT, 0, "0x", "0x", "call", "call", None, 0, 0, 0, None, None, 1,
+             "2018-01-01 00:00:00", block_number, "0xblock%d" % block_number)]
+
+
+@pytest.fixture
+def db_folder(tmp_path):
+    for name in ("traces", "token_transfers"):
+        os.mkdir(os.path.join(tmp_path, "ethereum_%s" % name))
+    token_db = SingleTokenTransferDatabase(
+        os.path.join(tmp_path, "ethereum_token_transfers", db_filename("token_transfers", DATE)), DATE)
+    token_db.create_token_transfers_table()
+    token_db.commit()
+    token_db.close()
+    return str(tmp_path)
+
+
+def append_block(db_folder, block_number):
+    traces_folder = os.path.join(db_folder, "ethereum_traces")
+    trace_db = SingleTraceDatabase(os.path.join(traces_folder, db_filename("traces", DATE)), DATE)
+    trace_db.create_traces_table()
+    trace_db.insert_traces(block_traces(block_number))
+    trace_db.commit()
+    trace_db.close()
+    SubtraceBuilder(traces_folder).build_day(DATE, incremental=True)
+
+
+def build_index(db_folder, index_folder, processes):
+    cca = ContractCentricAnalysis(db_folder, index_folder=index_folder)
+    cca.build_contract_transactions_index(PreProcess(db_folder), processes=processes)
+    cca.database["contract_transactions"].close()
+
+    index = LocalContractTransactions(index_folder, read_only=True)
+    txs = index.read_transactions_of_contract(CONTRACT)
+    progress = index.read_index_progress()
+    index.close()
+    return dict(txs), progress
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_reindex_grown_day(db_folder, tmp_path, processes):
+    index_folder = os.path.join(tmp_path, "index")
+    os.mkdir(index_folder)
+
+    append_block(db_folder, 1)
+    txs, progress = build_index(db_folder, index_folder, processes)
+    assert txs == {DATE: [tx_hash(1)]}
+    assert progress == {DATE: 1}
+
+    # the day was still being crawled
+    append_block(db_folder, 2)
+    txs, progress = build_index(db_folder, index_folder, processes)
+    assert txs == {DATE: [tx_hash(1), tx_hash(2)]}
+    assert progress == {DATE: 2}
+
+    assert build_index(db_folder, index_folder, processes) == (txs, progress)
+    assert os.listdir(index_folder) == ["contract_transactions.sqlite3"]
@@ -0,0 +1,28 @@
+import json
+import os
+from datetime import datetime
+
+from transaction_trace.remote import EthereumExport
+
+
+def write_hour(export_folder, hour, block_number):
+    day_folder = os.path.join(export_folder, "blocks", "2018-01-01")
+    os.makedirs(day_folder, exist_ok=True)
+    with open(os.path.join(day_folder, "%02d.json" % hour), "w") as f:
+        f.write(json.dumps({"timestamp": "2018-01-01 %02d:30:00 UTC" % hour, "number": block_number}) + "\n")
+
+
+def test_pool_reused_across_windows(tmp_path):
+    for hour in range(4):
+        write_hour(str(tmp_path), hour, hour)
+
+    export = EthereumExport(str(tmp_path), processes=2)
+    try:
+        rows = list(export.get_ethereum_data(datetime(2018, 1, 1, 0), datetime(2018, 1, 1, 2), "blocks"))
+        pool = export.pool
+        rows += list(export.get_ethereum_data(datetime(2018, 1, 1, 2), datetime(2018, 1, 1, 4), "blocks"))
+        assert export.pool is pool
+    finally:
+        export.close()
+
+    assert [row[1] for row in rows] == [0, 1, 2, 3]
@@ -0,0 +1,16 @@
+import logging
+
+import networkx as nx
+
+from transaction_trace.analysis.checkers import ReentrancyChecker
+
+
+def test_cycles_bounded_by_count_only(caplog):
+    checker = ReentrancyChecker(1, max_cycles=3)
+    assert checker.time_budget is None
+
+    graph = nx.complete_graph(5, nx.DiGraph())
+    with caplog.at_level(logging.WARNING):
+        cycles = list(checker.bounded_cycles(graph, "0xtx"))
+    assert len(cycles) == 3
+    assert "0xtx" in caplog.text
@@ -0,0 +1,44 @@
+import pytest
+
+from transaction_trace.analysis.intermediate_representations import ResultGraph
+from transaction_trace.analysis.knowledge import SensitiveAPIs, SignatureDatabase
+
+
+@pytest.fixture
+def signature_database(tmp_path, monkeypatch):
+    source = tmp_path / "signatures.txt"
+    source.write_text("0xa9059cbb transfer(address,uint256)\n"
+                      "0x13af4035 setOwner(address)\n"
+                      "0x12345678 foo(uint256)\n")
+    SignatureDatabase.compile(str(source), str(tmp_path / "signatures.db")).close()
+
+    monkeypatch.setattr(SensitiveAPIs, "_signature_database", None)
+    monkeypatch.setattr(SensitiveAPIs, "_signature_cache", None)
+    SensitiveAPIs.load_signature_database(str(tmp_path / "signatures.db"))
+    yield SensitiveAPIs._signature_database
+    SensitiveAPIs._signature_database.close()
+
+
+def test_function_without_selector(signature_database):
+    assert SensitiveAPIs.function(None) is None
+    assert SensitiveAPIs.lookup(None) is None
+    assert not SensitiveAPIs.sensitive_function_call(None)
+
+
+def test_suicide_trace_results(signature_database):
+    trace = {
+        'trace_type': 'suicide',
+        'status': 1,
+        'value': 0,
+        'input': None,
+        'from_address': '0x' + '11' * 20,
+        'to_address': '0x' + '22' * 20,
+    }
+    assert ResultGraph.trace_results(trace) == dict()
+
+
+def test_encoded_functions_cached():
+    encoded_functions = SensitiveAPIs.encoded_functions()
+    assert SensitiveAPIs.encoded_functions() is encoded_functions
+    assert encoded_functions['token']['0xa9059cbb'] == SensitiveAPIs.registry()['0xa9059cbb'].encoded_name
+    assert SensitiveAPIs.owner_change_functions() is encoded_functions['owner']
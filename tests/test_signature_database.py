@@ -0,0 +1,51 @@
+import pytest
+
+from transaction_trace.analysis.knowledge import SignatureDatabase
+from transaction_trace.analysis.knowledge.signature_database import classify_signature
+
+
+@pytest.mark.parametrize("signature, expected", [
+    ("transferOwnership(address)", ('owner', 0)),
+    ("setOwner(address)", ('owner', 0)),
+    ("changeOwner(address)", ('owner', 0)),
+    ("addOwner(address)", ('owner', 0)),
+    ("initWallet(address[],uint256,uint256)", ('owner', 0)),
+    ("transfer(address,uint256)", ('token', (0, 1))),
+    ("transferFrom(address,address,uint256)", ('token', (0, 1, 2))),
+    ("mint(address,uint256)", ('token', (0, 1))),
+    ("batchTransfer(address[],uint256)", ('token', (0, 1))),
+    ("multiTransfer(address[],uint256[])", ('token', (0, 1))),
+])
+def test_classify_sensitive(signature, expected):
+    assert classify_signature(signature) == expected
+
+
+@pytest.mark.parametrize("signature", [
+    "isOwner(address)",
+    "getOwner(address)",
+    "hasOwner(address)",
+    "canTransfer(address,uint256)",
+    "owner()",
+    "renounceOwnership()",
+    "setMinter(address,uint256)",
+    "transferAllowed(address,uint256)",
+    "ownerOf(uint256)",
+    "transfer(address)",
+    "transfer((address,uint256))",
+])
+def test_classify_not_sensitive(signature):
+    assert classify_signature(signature) == (None, None)
+
+
+def test_compiled_sensitive_functions(tmp_path):
+    source = tmp_path / "signatures.txt"
+    source.write_text("0x2f54bf6e isOwner(address)\n"
+                      "setMinter(address,uint256)\n"
+                      "0xa9059cbb transfer(address,uint256)\n")
+    db = SignatureDatabase.compile(str(source), str(tmp_path / "signatures.db"))
+    try:
+        assert len(db) == 3
+        assert db.signature("0x2f54bf6e") == "isOwner(address)"
+        assert [f[:3] for f in db.sensitive_functions()] == [("0xa9059cbb", 'token', "transfer(address,uint256)")]
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+import os
+
+from transaction_trace.analysis import SubtraceBuilder
+from transaction_trace.local.ethereum_database import db_filename
+from transaction_trace.local.single_database import SingleTraceDatabase
+
+DATE = "2018-01-01"
+
+
+def trace_row(tx_hash, tx_index, trace_address, block_number):
+    return (tx_hash, tx_index, "0x" + "11" * 20, "0x" + "22" * 20, 0, "0x", "0x", "call", "call", None, 0, 0, 0,
+            trace_address, None, 1, "2018-01-01 00:00:00", block_number, "0xblock%d" % block_number)
+
+
+def block_traces(block_number):
+    tx_hash = "0x%064x" % block_number
+    return [trace_row(tx_hash, 0, None, block_number), trace_row(tx_hash, 0, "0", block_number),
+            trace_row(tx_hash, 0, "0,0", block_number)]
+
+
+def journal_mode(db):
+    return db.read("pragma_journal_mode", "*").fetchone()[0]
+
+
+def test_incremental_build_while_crawling(tmp_path):
+    # the crawler keeps its connection to the day open in WAL mode, with the traces index dropped
+    writer = SingleTraceDatabase(os.path.join(tmp_path, db_filename("traces", DATE)), DATE)
+    writer.begin_bulk_load(journal_mode="WAL")
+    writer.create_traces_table()
+    writer.drop_traces_index()
+    writer.insert_traces(block_traces(1))
+    writer.commit()
+
+    builder = SubtraceBuilder(str(tmp_path))
+    builder.build_day(DATE, incremental=True)
+
+    writer.insert_traces(block_traces(2))
+    writer.commit()
+    builder.build_day(DATE, incremental=True)
+
+    assert journal_mode(writer) == "wal"
+    assert writer.read("sqlite_master", "name", "WHERE name = 'traces_order_index'").fetchone() is None
+    subtraces = [tuple(row) for row in writer.read("subtraces", "*", "ORDER BY trace_id")]
+    assert subtraces == [("0x%064x" % 1, 1, None), ("0x%064x" % 1, 2, 1), ("0x%064x" % 1, 3, 2),
+                         ("0x%064x" % 2, 4, None), ("0x%064x" % 2, 5, 4), ("0x%064x" % 2, 6, 5)]
+    writer.close()
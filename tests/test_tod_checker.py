@@ -0,0 +1,8 @@
+from transaction_trace.analysis.checkers.tod_checker import StorageAccess
+
+
+def test_storage_accesses_without_code():
+    access = StorageAccess("0xtx", "0xc")
+    assert access.storage_accesses() == set()
+    assert access.loaded_slots() == set()
+    assert access.stored_slots() == set()
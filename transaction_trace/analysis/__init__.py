@@ -1,4 +1,5 @@
 from .subtrace import SubtraceBuilder
+from .ir_cache import IRCache
 from .pre_process import PreProcess
 from .contract_centric_analysis import ContractCentricAnalysis
 from .transaction_centric_analysis import TransactionCentricAnalysis
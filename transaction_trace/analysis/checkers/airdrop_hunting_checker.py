@@ -29,15 +29,15 @@ class AirdropHuntingChecker(Checker):
         intentions = list()
         expected_token_transfers = set()
         for s in slaves:  # check whether these slaves cause any token transfers
-            prg = ResultGraph.build_partial_result_graph(result_graph.t, s)
+            balances = result_graph.t.subtree_balances(s)
 
             results = list()
-            for node in prg.nodes():
-                for result_type in prg.nodes[node]:
+            for node in balances:
+                for result_type in balances[node]:
                     # in airdrop hunting, we only concern about token transfer
                     if ResultGraph.extract_result_type(result_type) == ResultType.TOKEN_TRANSFER:
                         expected_token_transfers.add(ResultGraph.extract_token_address(result_type))
-                        amount = prg.nodes[node][result_type]
+                        amount = balances[node][result_type]
                         if amount > 0:
                             results.append({
                                 "profit_node": node,
@@ -45,7 +45,7 @@ class AirdropHuntingChecker(Checker):
                                 "amount": amount,
                             })
                     elif ResultGraph.extract_result_type(result_type) == ResultType.ETHER_TRANSFER:
-                        amount = prg.nodes[node][result_type]
+                        amount = balances[node][result_type]
                         if amount > 0:
                             results.append({
                                 "profit_node": node,
@@ -3,7 +3,6 @@ from collections import defaultdict
 
 from ...basic_utils import DatetimeUtils
 from ...local import DatabaseName
-from ..intermediate_representations import ActionTree
 from ..knowledge import SensitiveAPIs
 from ..results import AttackCandidate, ResultType
 from .checker import Checker, CheckerType
@@ -35,8 +34,8 @@ class CallAfterDestructChecker(Checker):
         at = action_tree.t
 
         for e in at.edges():
-            from_address = ActionTree.extract_address_from_node(e[0])
-            to_address = ActionTree.extract_address_from_node(e[1])
+            from_address = at.address(e[0])
+            to_address = at.address(e[1])
             trace = at.edges[e]
 
             if trace["status"] == 0:
@@ -24,8 +24,8 @@ class CallInjectionChecker(Checker):
 
         candidates = list()
         for e in at.edges():
-            from_address = ActionTree.extract_address_from_node(e[0])
-            to_address = ActionTree.extract_address_from_node(e[1])
+            from_address = at.address(e[0])
+            to_address = at.address(e[1])
             trace = at.edges[e]
 
             # call-injection only happens when the trace type is "call"
@@ -50,15 +50,13 @@ class CallInjectionChecker(Checker):
                 parent_input = parent_trace['input']
                 # TODO: not consider fallback function in "call" may cause FN, but also reduce FP on same func-name
                 if len(parent_input) > 10:
-                    if called_func[2:] in parent_input[10:]:
+                    if parent_input.find(called_func[2:], 10) >= 0:
                         input_control = True
                     else:
-                        encoded_functions = SensitiveAPIs.encoded_functions()
-                        for t in encoded_functions:
-                            if called_func in encoded_functions[t]:
-                                encoded_callee = encoded_functions[t][called_func]
-                                if encoded_callee in parent_input[10:]:
-                                    input_control = True
+                        # only the name of the called function itself can be passed, so one search is enough
+                        function = SensitiveAPIs.function(called_func)
+                        if function is not None and parent_input.find(function.encoded_name, 10) >= 0:
+                            input_control = True
 
                 if input_control:
                     candidates.append((e, parent_edge))
@@ -70,23 +68,23 @@ class CallInjectionChecker(Checker):
             ancestors = ActionTree.get_ancestors_from_tree(at, e[0])
             call_type = at.edges[e]['call_type']
 
-            prg = ResultGraph.build_partial_result_graph(result_graph.t, e[0])
+            transfers = result_graph.t.subtree_transfers(e[0])
             intentions = {
                 "ancestor_profits": dict(),
                 "other_profits": dict(),
             }
-            for e in prg.edges():
+            for e in transfers:
                 intention = dict()
-                for result_type in prg.edges[e]:
+                for result_type in transfers[e]:
                     rt = ResultGraph.extract_result_type(result_type)
                     if rt == ResultType.OWNER_CHANGE:
                         intention[result_type] = None
                     elif rt == ResultType.ETHER_TRANSFER:
-                        if prg.edges[e][result_type] > self.minimum_profit_amount[rt]:
-                            intention[result_type] = prg.edges[e][result_type]
+                        if transfers[e][result_type] > self.minimum_profit_amount[rt]:
+                            intention[result_type] = transfers[e][result_type]
                     elif rt == ResultType.TOKEN_TRANSFER:
-                        if prg.edges[e][result_type] > self.minimum_profit_amount[rt]:
-                            intention[result_type] = prg.edges[e][result_type]
+                        if transfers[e][result_type] > self.minimum_profit_amount[rt]:
+                            intention[result_type] = transfers[e][result_type]
                     else:
                         continue
                 if len(intention) > 0:
@@ -98,7 +96,7 @@ class CallInjectionChecker(Checker):
 
             if len(intentions["ancestor_profits"]) > 0 or len(intentions["other_profits"]) > 0:
                 attacks.append({
-                    "entry_edge": parent_edge,
+                    "entry_edge": (at.label(parent_edge[0]), at.label(parent_edge[1])),
                     'intentions': intentions
                 })
 
@@ -3,7 +3,6 @@ from collections import defaultdict
 from datetime import timedelta, timezone
 
 from ...basic_utils import DatetimeUtils
-from ..intermediate_representations import ActionTree
 from ..results import AttackCandidate, ResultType
 from .checker import Checker, CheckerType
 
@@ -144,8 +143,8 @@ class HoneypotChecker(Checker):
         # root = [n for n, d in at.in_degree() if d == 0][0]
         # for e in at.edges(root):
         for e in at.edges():
-            from_address = ActionTree.extract_address_from_node(e[0])
-            to_address = ActionTree.extract_address_from_node(e[1])
+            from_address = at.address(e[0])
+            to_address = at.address(e[1])
             trace = at.edges[e]
 
             if trace["status"] == 0 or trace["trace_type"] not in ("call", "suicide"):
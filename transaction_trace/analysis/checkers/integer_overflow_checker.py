@@ -1,7 +1,7 @@
 import pickle
 
 from ...basic_utils import DatetimeUtils
-from ..intermediate_representations import ActionTree, ResultGraph
+from ..intermediate_representations import ResultGraph
 from ..knowledge import SensitiveAPIs
 from ..results import AttackCandidate, ResultType
 from .checker import Checker, CheckerType
@@ -31,14 +31,13 @@ class IntegerOverflowChecker(Checker):
             trace = at.edges[e]
             if trace['trace_type'] != "call":
                 continue
-            to_address = ActionTree.extract_address_from_node(e[1])
+            to_address = at.address(e[1])
             if to_address in self.contract_creator and tx.caller == self.contract_creator[to_address]:
                 continue
 
-            if SensitiveAPIs.sensitive_function_call(trace['input']):
-                func_name = SensitiveAPIs.func_name(trace['input'])
-                if func_name in SensitiveAPIs._integer_overflow_sensitive_functions:
-                    candidates.append((e, func_name))
+            function = SensitiveAPIs.lookup(trace['input'])
+            if function is not None and function.integer_overflow:
+                candidates.append((e, function.signature))
 
         intentions = list()
         sensitive_nodes = set()
@@ -65,7 +64,7 @@ class IntegerOverflowChecker(Checker):
 
             if len(intention) > 0:
                 intentions.append({
-                    'edge': edge,
+                    'edge': (at.label(edge[0]), at.label(edge[1])),
                     'func_name': func_name,
                     'intention': intention
                 })
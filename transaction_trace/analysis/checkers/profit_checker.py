@@ -22,6 +22,11 @@ def check_time_interval(begin_time, end_time, date, time):
         return False
 
 
+def row_time_to_str(t):
+    # connections with raw types return timestamps as text
+    return t[:19] if isinstance(t, str) else DatetimeUtils.time_to_str(t)
+
+
 class ProfitChecker(Checker):
 
     def __init__(self, attack_candidate_exporter):
@@ -50,24 +55,21 @@ class ProfitChecker(Checker):
                    contract, account, time, income_type)
 
         txs = self.database[DatabaseName.CONTRACT_TRANSACTIONS_DATABASE].read_transactions_of_contract(
-            contract)
+            contract, from_date=time[:10], to_date=timestamp[:10])
         l.info("%d dates for %s", len(txs), contract)
         for date in txs:
-            if date > timestamp[:10] or date < time[:10]:
-                continue
-
             if rt == ResultType.ETHER_TRANSFER:
                 trace_con = self.database[DatabaseName.TRACE_DATABASE].get_connection(
                     date)
                 traces = defaultdict(list)
-                for row in trace_con.read('traces', "transaction_hash, from_address, to_address, value, status, block_timestamp"):
+                for row in trace_con.read('traces', "transaction_hash, from_address, to_address, value, trace_type, status, block_timestamp"):
                     if row['trace_type'] not in ('call', 'create', 'suicide'):
                         continue
                     tx_hash = row['transaction_hash']
                     traces[tx_hash].append(row)
 
                 for tx_hash in txs[date]:
-                    if not check_time_interval(time, timestamp, date, DatetimeUtils.time_to_str(traces[tx_hash][0]['block_timestamp'])):
+                    if not check_time_interval(time, timestamp, date, row_time_to_str(traces[tx_hash][0]['block_timestamp'])):
                         continue
                     for trace in traces[tx_hash]:
                         if trace['status'] == 0:
@@ -89,7 +91,7 @@ class ProfitChecker(Checker):
                 for tx_hash in txs[date]:
                     if tx_hash not in token_transfers:
                         continue
-                    if not check_time_interval(time, timestamp, date, DatetimeUtils.time_to_str(token_transfers[tx_hash][0]['block_timestamp'])):
+                    if not check_time_interval(time, timestamp, date, row_time_to_str(token_transfers[tx_hash][0]['block_timestamp'])):
                         continue
                     for token_transfer in token_transfers[tx_hash]:
                         if token_transfer['token_address'] != token_address:
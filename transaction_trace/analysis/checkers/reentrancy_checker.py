@@ -1,3 +1,5 @@
+import logging
+import time
 from collections import defaultdict
 
 import networkx as nx
@@ -7,12 +9,26 @@ from ..intermediate_representations import ActionTree, ResultGraph
 from ..results import AttackCandidate, ResultType
 from .checker import Checker, CheckerType
 
+l = logging.getLogger("transaction-trace.analysis.checkers.ReentrancyChecker")
+
 
 class ReentrancyChecker(Checker):
 
-    def __init__(self, threshold):
+    def __init__(self, threshold, max_traces=None, max_cycles=10000, time_budget=None):
+        """
+        Cycle enumeration is exponential in the worst case, so it is bounded per transaction: transactions with more
+        than `max_traces` traces are skipped, and at most `max_cycles` cycles are checked, optionally within
+        `time_budget` seconds. None disables a bound. The time budget makes the results depend on the load of the
+        machine, so it is off by default.
+
+        Skipped and truncated transactions are logged as warnings with their hash, so they can be checked again
+        with larger bounds.
+        """
         super(ReentrancyChecker, self).__init__("reentrancy")
         self.threshold = threshold
+        self.max_traces = max_traces
+        self.max_cycles = max_cycles
+        self.time_budget = time_budget
 
     @property
     def checker_type(self):
@@ -20,7 +36,7 @@ class ReentrancyChecker(Checker):
 
     def count_iter_num(self, graph, cycle):
         edges = ActionTree.get_edges_from_cycle(cycle)
-        walk = {'max_height': 0, 'trace_id': 0, 'edge': ()}
+        walk = {'max_height': 0, 'trace_id': None, 'edge': ()}
         call_traces = dict()
 
         for e in edges:
@@ -51,9 +67,53 @@ class ReentrancyChecker(Checker):
         if len(walked_edges) > 0:
             turns_count += 0.5
 
-        entry = "%s:%s" % (walk['trace_id'], walk['edge'][0])
+        # the node calling into the outermost walked trace
+        entry = walk['trace_id']
         return entry, turns_count
 
+    @staticmethod
+    def has_repeated_call(tree):
+        """
+        Whether the same call between two addresses appears twice on a root-to-leaf path, in one pass over the tree.
+        """
+        for root, degree in tree.in_degree():
+            if degree > 0:
+                continue
+            on_path = defaultdict(int)
+            stack = [(root, iter(tree.successors(root)), None)]
+            while len(stack) > 0:
+                node, children, pair = stack[-1]
+                child = next(children, -1)
+                if child < 0:
+                    stack.pop()
+                    if pair is not None:
+                        on_path[pair] -= 1
+                    continue
+
+                pair = (tree.address(node), tree.address(child))
+                if pair[0] == pair[1]:
+                    pair = None
+                else:
+                    if on_path[pair] > 0:
+                        return True
+                    on_path[pair] += 1
+                stack.append((child, iter(tree.successors(child)), pair))
+        return False
+
+    def bounded_cycles(self, graph, tx_hash):
+        """
+        Simple cycles of the graph until the cycle or time budget runs out.
+        """
+        start = time.monotonic()
+        for i, cycle in enumerate(nx.simple_cycles(graph)):
+            if self.max_cycles is not None and i >= self.max_cycles:
+                l.warning("truncated: stop searching cycles of %s after %d cycles", tx_hash, i)
+                return
+            if self.time_budget is not None and time.monotonic() - start > self.time_budget:
+                l.warning("truncated: stop searching cycles of %s after %d seconds", tx_hash, self.time_budget)
+                return
+            yield cycle
+
     def check_transaction(self, action_tree, result_graph):
         tx = action_tree.tx
         at = action_tree.t
@@ -62,11 +122,19 @@ class ReentrancyChecker(Checker):
         if len(at.edges()) < 2 * self.threshold:
             return
 
+        if self.max_traces is not None and len(at.edges()) > self.max_traces:
+            l.warning("skip %s with %d traces", tx.tx_hash, len(at.edges()))
+            return
+
+        # more than one turn of a cycle re-enters one of its calls on the same call stack
+        if self.threshold >= 1 and not self.has_repeated_call(at):
+            return
+
         # build call graph to find cycles
         g = nx.DiGraph()
         for e in at.edges():
-            from_address = ActionTree.extract_address_from_node(e[0])
-            to_address = ActionTree.extract_address_from_node(e[1])
+            from_address = at.address(e[0])
+            to_address = at.address(e[1])
             trace = at.edges[e]
 
             g.add_edge(from_address, to_address)
@@ -74,18 +142,14 @@ class ReentrancyChecker(Checker):
                 g[from_address][to_address]["call_traces"] = list()
 
             g[from_address][to_address]["call_traces"].append({
-                "trace_id": ActionTree.extract_trace_id_from_node(e[1]),
-                "parent_trace_id": ActionTree.extract_trace_id_from_node(e[0]),
+                "trace_id": e[1],
+                "parent_trace_id": e[0],
                 "height": len(trace["trace_address"]) if trace["trace_address"] != None else 0,
             })
 
         candidates = list()
         # search for reentrancy candidates cycle by cycle
-        cycles = list(nx.simple_cycles(g))
-        if len(cycles) == 0:
-            return
-
-        for cycle in cycles:
+        for cycle in self.bounded_cycles(g, tx.tx_hash):
             if len(cycle) < 2 or tx.caller in cycle:
                 continue
             entry, iter_num = self.count_iter_num(g, cycle)
@@ -96,28 +160,28 @@ class ReentrancyChecker(Checker):
         sensitive_nodes = set()
         # search partial-result-graph for each candidate
         for (entry, cycle, iter_num) in candidates:
-            prg = ResultGraph.build_partial_result_graph(result_graph.t, entry)
+            transfers = result_graph.t.subtree_transfers(entry)
 
             intention = dict()
-            for e in prg.edges():
+            for e in transfers:
                 result = dict()
-                for result_type in prg.edges[e]:
+                for result_type in transfers[e]:
                     rt = ResultGraph.extract_result_type(result_type)
                     if rt == ResultType.OWNER_CHANGE:
                         continue
                     elif rt == ResultType.ETHER_TRANSFER:
-                        if prg.edges[e][result_type] > self.minimum_profit_amount[result_type]:
-                            result[result_type] = prg.edges[e][result_type]
+                        if transfers[e][result_type] > self.minimum_profit_amount[result_type]:
+                            result[result_type] = transfers[e][result_type]
                     elif rt == ResultType.TOKEN_TRANSFER:
-                        if prg.edges[e][result_type] > self.minimum_profit_amount[ResultType.TOKEN_TRANSFER]:
-                            result[result_type] = prg.edges[e][result_type]
+                        if transfers[e][result_type] > self.minimum_profit_amount[ResultType.TOKEN_TRANSFER]:
+                            result[result_type] = transfers[e][result_type]
                 if len(result) > 0:
                     intention[str(e)] = result
                     sensitive_nodes.add(e[1])
 
             if len(intention) > 0:
                 intentions.append({
-                    "entry": entry,
+                    "entry": at.label(entry),
                     "cycle": cycle,
                     "iter_num": iter_num,
                     "intention": intention
@@ -1,7 +1,8 @@
 import logging
 from collections import defaultdict
 
-from ...local import ContractCode, EVMExecutor
+from ...basic_utils import LRUCache
+from ...local import BytecodeFile, ContractCode, EVMExecutor, LocalContractCode
 from ..results import AttackCandidate, ResultType
 from .checker import Checker, CheckerType
 
@@ -12,20 +13,16 @@ evm = EVMExecutor()
 
 class StorageAccess:
 
-    def __init__(self, tx_hash, contract, contract_code):
+    def __init__(self, tx_hash, contract, contract_code=None):
         self.tx_hash = tx_hash
         self.contract = contract
-
-        if contract_code is not None:
-            deployed_code = evm.deployed_code(contract_code)
-        else:
-            deployed_code = "0x"
-        self.deployed_code = deployed_code if deployed_code != "0x" else contract_code
+        self.contract_code = contract_code
 
         self.inputs = set()
 
         self.cause_ether_flow = False
 
+        self._deployed_code = None
         self._storage_accesses = None
 
     def __eq__(self, other):
@@ -33,41 +30,142 @@ class StorageAccess:
             return False
         return self.tx_hash == other.tx_hash and self.contract == other.contract
 
+    @property
+    def deployed_code(self):
+        if self._deployed_code is None:
+            StorageAccess.prefetch_deployed_codes([self])
+        return self._deployed_code
+
+    def _set_deployed_code(self, deployed_code):
+        self._deployed_code = deployed_code if deployed_code != "0x" else self.contract_code
+
     def storage_accesses(self):
         if self._storage_accesses is None:
-            self._storage_accesses = set()
-            for input_data in self.inputs:
-                self._storage_accesses = self._storage_accesses.union(
-                    evm.log_storage_accesses(self.deployed_code, input_data))
+            StorageAccess.prefetch_storage_accesses([self])
         return self._storage_accesses
 
+    def loaded_slots(self):
+        return {index for op, index in self.storage_accesses() if op == "load"}
+
+    def stored_slots(self):
+        return {index for op, index in self.storage_accesses() if op == "store"}
+
+    @staticmethod
+    def prefetch_deployed_codes(accesses):
+        """
+        Deploy the code of many contracts with one batch of evm runs.
+        """
+        pending = [access for access in accesses if access._deployed_code is None]
+        creations = [access for access in pending if access.contract_code is not None]
+        for access, deployed_code in zip(creations, evm.deployed_codes([a.contract_code for a in creations])):
+            access._set_deployed_code(deployed_code)
+        for access in pending:
+            if access.contract_code is None:
+                access._set_deployed_code("0x")
+
+    @staticmethod
+    def prefetch_storage_accesses(accesses):
+        """
+        Trace the storage accesses of many calls with one batch of evm runs.
+        """
+        pending = [access for access in accesses if access._storage_accesses is None]
+        StorageAccess.prefetch_deployed_codes(pending)
+        jobs = [(access.deployed_code, input_data) for access in pending for input_data in access.inputs]
+        access_logs = iter(evm.log_storage_accesses_batch(jobs))
+        for access in pending:
+            access._storage_accesses = set()
+            for _ in access.inputs:
+                access._storage_accesses = access._storage_accesses.union(next(access_logs))
+
+
+_missing = object()
+
 
 class CachedCodeDatabase:
+    """
+    Bytecode of contracts, fetched on demand and kept in LRU caches, the bytecodes bounded by `cache_size` bytes.
+
+    Bytecodes are read from MySQL in batches by `prefetch`, or from a LocalContractCode store in `code_db_folder`,
+    or from a file written by `BytecodeFile.write` if `bytecode_filepath` is given, in which case no database is used.
+    """
+
+    def __init__(self, passwd, cache_size=1 << 30, bytecode_filepath=None, batch_size=1000, code_db_folder=None):
+        self.passwd = passwd
+        self.code_db_folder = code_db_folder
+        self.batch_size = batch_size
+        self._code_database = None
+        self.bytecode_file = BytecodeFile(bytecode_filepath) if bytecode_filepath is not None else None
 
-    def __init__(self, passwd):
-        self.code_database = ContractCode(passwd=passwd)
+        # address -> bytecode hash, None if the address is not a contract
+        self.contract_bytecode = LRUCache(1 << 20)
+        self.bytecodes = LRUCache(cache_size, weigh=len)
 
-        self.bytecodes = dict()
-        l.info("preload bytecodes")
-        for row in self.code_database.read("byte_code", "distinct(bytecode_hash), bytecode"):
-            self.bytecodes[row[0]] = row[1]
+    @property
+    def code_database(self):
+        if self._code_database is None:
+            if self.code_db_folder is not None:
+                self._code_database = LocalContractCode(self.code_db_folder, read_only=True)
+            else:
+                self._code_database = ContractCode(passwd=self.passwd)
+        return self._code_database
+
+    def prefetch(self, contracts):
+        """
+        Fetch the bytecodes of the contracts which are not cached, in batches.
+        """
+        missing = [contract for contract in set(contracts) if contract not in self.contract_bytecode]
+
+        if self.bytecode_file is not None:
+            for contract in missing:
+                code = self.bytecode_file.read(contract)
+                if code is None:
+                    self.contract_bytecode.put(contract, None)
+                else:
+                    self.contract_bytecode.put(contract, code[0])
+                    self.bytecodes.put(code[0], code[1])
+            return
 
-        l.info("preload contracts' code hashes")
-        self.contract_bytecode = dict()
-        for row in self.code_database.read("byte_code", "address, bytecode_hash"):
-            self.contract_bytecode[row[0]] = row[1]
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            hashes = dict()
+            for row in self.code_database.read_bytecode_hashes(batch):
+                hashes[row[0]] = row[1]
+            for contract in batch:
+                self.contract_bytecode.put(contract, hashes.get(contract))
+            self._fetch_bytecodes(set(hashes.values()))
+
+    def _fetch_bytecodes(self, bytecode_hashes):
+        missing = [h for h in bytecode_hashes if h is not None and h not in self.bytecodes]
+        for i in range(0, len(missing), self.batch_size):
+            for row in self.code_database.read_bytecodes_by_hash(missing[i:i + self.batch_size]):
+                self.bytecodes.put(row[0], row[1])
 
     def read_bytecode(self, contract):
-        if contract not in self.contract_bytecode:
+        bytecode_hash = self.contract_bytecode.get(contract, _missing)
+        if bytecode_hash is _missing:
+            self.prefetch([contract])
+            bytecode_hash = self.contract_bytecode.get(contract)
+        if bytecode_hash is None:
             return None
-        return self.bytecodes[self.contract_bytecode[contract]]
+
+        bytecode = self.bytecodes.get(bytecode_hash)
+        if bytecode is None:
+            if self.bytecode_file is not None:
+                # evicted bytecodes are read again from the file
+                self.contract_bytecode.pop(contract)
+                self.prefetch([contract])
+            else:
+                self._fetch_bytecodes([bytecode_hash])
+            bytecode = self.bytecodes.get(bytecode_hash)
+        return bytecode
 
 
 class TODChecker(Checker):
 
-    def __init__(self, passwd="password"):
+    def __init__(self, passwd="password", bytecode_filepath=None, code_db_folder=None):
         super(TODChecker, self).__init__("transaction-order-dependence-checker")
-        self.code_database = CachedCodeDatabase(passwd)
+        self.code_database = CachedCodeDatabase(passwd, bytecode_filepath=bytecode_filepath,
+                                                code_db_folder=code_db_folder)
 
         self.latest_block = None
         self.contract_accesses = defaultdict(list)
@@ -84,46 +182,42 @@ class TODChecker(Checker):
         if self.latest_block is None:
             self.latest_block = tx.block_number
         if tx.block_number != self.latest_block:
-            # check whether TOD happens in previous block
-            for contract, accessed_txs in self.contract_accesses.items():
-                if len(accessed_txs) < 2:
-                    continue
+            # skip contracts accessed once or by txs which cause no ether flow
+            candidate_contracts = [
+                contract for contract, accessed_txs in self.contract_accesses.items()
+                if len(accessed_txs) >= 2 and any(accessed_tx.cause_ether_flow for accessed_tx in accessed_txs)
+            ]
+            self.code_database.prefetch(candidate_contracts)
+            for contract in candidate_contracts:
+                contract_code = self.code_database.read_bytecode(contract)
+                for accessed_tx in self.contract_accesses[contract]:
+                    accessed_tx.contract_code = contract_code
+            StorageAccess.prefetch_storage_accesses(
+                [accessed_tx for contract in candidate_contracts for accessed_tx in self.contract_accesses[contract]])
 
-                # skip txs which cause no ether flow
-                ether_related = False
-                for accessed_tx in accessed_txs:
-                    if accessed_tx.cause_ether_flow:
-                        ether_related = True
-                        break
-                if not ether_related:
-                    continue
+            # check whether TOD happens in previous block
+            for contract in candidate_contracts:
+                accessed_txs = self.contract_accesses[contract]
 
                 # cross-tx read after write is regarded as TOD
-                stored_index = dict()
+                # a tx reads the state left by the previous ones, so its loads are checked before its stores
+                last_writer = dict()
                 affected_txs = list()
                 ether_flow = False
                 for accessed_tx in accessed_txs:
-                    affected = False
-                    affected_by = list()
-                    affected_index = list()
-                    for op, index in accessed_tx.storage_accesses():
-                        if op == "load":
-                            if index in stored_index and stored_index[index] != accessed_tx.tx_hash:
-                                affected = True
-                                if index not in affected_index:
-                                    affected_index.append(index)
-                                    affected_by.append(stored_index[index])
-                        elif op == "store":
-                            stored_index[index] = accessed_tx.tx_hash
-
-                    if affected:
+                    affected_by = [(last_writer[index], index) for index in sorted(accessed_tx.loaded_slots())
+                                   if index in last_writer and last_writer[index] != accessed_tx.tx_hash]
+                    for index in accessed_tx.stored_slots():
+                        last_writer[index] = accessed_tx.tx_hash
+
+                    if len(affected_by) > 0:
                         if accessed_tx.cause_ether_flow:
                             ether_flow = True
 
                         affected_txs.append(
                             {
                                 "affected_tx": accessed_tx.tx_hash,
-                                "affected_by": list(zip(affected_by, affected_index)),
+                                "affected_by": affected_by,
                             }
                         )
 
@@ -160,7 +254,8 @@ class TODChecker(Checker):
             return
 
         called_contract = trace["to_address"]
-        access = StorageAccess(tx.tx_hash, called_contract, self.code_database.read_bytecode(called_contract))
+        # the code is only read for contracts checked at the end of the block
+        access = StorageAccess(tx.tx_hash, called_contract)
         access.inputs.add(trace["input"])
         access.cause_ether_flow = (trace["value"] > 0)
         for e in rg.edges:
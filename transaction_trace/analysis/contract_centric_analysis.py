@@ -1,21 +1,94 @@
 import logging
-from collections import defaultdict
+import multiprocessing
+import os
+import shutil
+import tempfile
 
-from ..basic_utils import DatetimeUtils
-from ..local import ContractTransactions, ContractTokenTransactions, DatabaseName
+from ..local import ContractTokenTransactions, DatabaseName, LocalContractTransactions
 from .checkers import CheckerType
+from .pre_process import PreProcess
 from .trace_analysis import TraceAnalysis
 
 l = logging.getLogger("transaction-trace.analysis.ContractCentricAnalysis")
 
+_worker_pre_process = None
+_worker_run_folder = None
+
+
+def _init_worker(worker_args, run_folder):
+    global _worker_pre_process, _worker_run_folder
+    _worker_pre_process = PreProcess.from_worker_args(worker_args)
+    _worker_run_folder = run_folder
+
+
+def _index_day(date):
+    return date, write_day_run(_worker_pre_process, date, _worker_run_folder)
+
+
+def contract_postings(call_tree, result_graph):
+    """
+    Arguments of `insert_transactions_of_contract` for the contracts of a transaction: the ones in its result graph
+    as sensitive, and the other ones of its successful traces.
+    """
+    normal_contracts = set()
+    for e in call_tree.t.edges:
+        trace = call_tree.t.edges[e]
+        if trace['status'] == 0:
+            continue
+
+        normal_contracts.add(trace['from_address'])
+        normal_contracts.add(trace['to_address'])
+
+    sensitive_contracts = set()
+    for contract in result_graph.g.nodes:
+        sensitive_contracts.add(contract)
+
+    unsensitive_contracts = normal_contracts - sensitive_contracts
+
+    tx = call_tree.tx
+    postings = list()
+    if len(sensitive_contracts) > 0:
+        postings.append((tx.tx_hash, tx.block_timestamp.date(), sensitive_contracts, True, tx.block_number,
+                         tx.tx_index))
+    if len(unsensitive_contracts) > 0:
+        postings.append((tx.tx_hash, tx.block_timestamp.date(), unsensitive_contracts, False, tx.block_number,
+                         tx.tx_index))
+    return postings
+
+
+def write_day_run(pre_process, date, run_folder):
+    """
+    Write the postings of every transaction of the day into a sorted run in `run_folder`, return its path.
+    """
+    records = list()
+    for call_tree, result_graph in pre_process.preprocess_day(date):
+        if call_tree is None:
+            continue
+        for posting in contract_postings(call_tree, result_graph):
+            records.extend(LocalContractTransactions.posting_records(*posting))
+
+    filepath = os.path.join(run_folder, "%s.run" % date)
+    LocalContractTransactions.write_posting_run(filepath, records)
+    l.info("%d postings of %s", len(records), date)
+    return filepath
+
 
 class ContractCentricAnalysis(TraceAnalysis):
 
-    def __init__(self, db_folder, idx_db_user="contract_txs_idx", idx_db_passwd="password", idx_db="contract_txs_idx"):
+    def __init__(self, db_folder, idx_db_user="contract_txs_idx", idx_db_passwd="password", idx_db="contract_txs_idx",
+                 read_only=False, raw_types=False, index_folder=None):
+        """
+        With `index_folder`, the contract-centric transaction index is a LocalContractTransactions in that folder
+        instead of the MySQL database.
+        """
         super(ContractCentricAnalysis, self).__init__(db_folder, [
-            DatabaseName.TRACE_DATABASE, DatabaseName.TOKEN_TRANSFER_DATABASE])
-        tx_index_db = ContractTokenTransactions(
-            user=idx_db_user, passwd=idx_db_passwd, db=idx_db)
+            DatabaseName.TRACE_DATABASE, DatabaseName.TOKEN_TRANSFER_DATABASE], read_only=read_only,
+            raw_types=raw_types)
+        if index_folder is not None:
+            tx_index_db = LocalContractTransactions(index_folder, read_only=read_only)
+        else:
+            tx_index_db = ContractTokenTransactions(
+                user=idx_db_user, passwd=idx_db_passwd, db=idx_db)
         self.database[DatabaseName.CONTRACT_TRANSACTIONS_DATABASE] = tx_index_db
 
         self.checkers = dict()
@@ -29,54 +102,98 @@ class ContractCentricAnalysis(TraceAnalysis):
         for _, checker in self.checkers.items():
             checker.do_check(**kwargs)
 
-    def build_contract_transactions_index(self, pre_process, column_index=False, db_cache_len=100000):
+    def build_contract_transactions_index(self, pre_process, column_index=False, db_cache_len=100000, processes=1,
+                                          merge_fan_in=64):
+        """
+        With a local index, every day is preprocessed by one of `processes` workers into a sorted run of postings,
+        and runs are merged into the index `merge_fan_in` days at a time. Days are indexed again only if traces have
+        been appended to them since, so running it again appends the new days and the rest of days which were
+        indexed while being crawled. Like incremental subtrace builds, this assumes traces are appended in whole
+        blocks.
+
+        The MySQL index is built from all the transactions of `pre_process`, `db_cache_len` rows at a time.
+        """
         tx_index_db = self.database[DatabaseName.CONTRACT_TRANSACTIONS_DATABASE]
         tx_index_db.create_contract_transactions_table()
 
-        db_cache = list()
+        if isinstance(tx_index_db, LocalContractTransactions):
+            # the WITHOUT ROWID primary key already is the index by contract, `column_index` is not needed
+            self._build_local_index(tx_index_db, pre_process, processes, merge_fan_in)
+        else:
+            db_cache = list()
+            for call_tree, result_graph in pre_process.preprocess(processes):
+                if call_tree is None:
+                    continue
 
-        for call_tree, result_graph in pre_process.preprocess():
-            if call_tree is None:
-                continue
+                l.debug("save index of %s", call_tree.tx.tx_hash)
+                db_cache.extend(contract_postings(call_tree, result_graph))
 
-            normal_contracts = set()
-            for e in call_tree.t.edges:
-                trace = call_tree.t.edges[e]
-                if trace['status'] == 0:
-                    continue
+                if len(db_cache) > db_cache_len:
+                    l.info("insert data from cache to database")
+                    for d in db_cache:
+                        tx_index_db.insert_transactions_of_contract(*d)
 
-                normal_contracts.add(trace['from_address'])
-                normal_contracts.add(trace['to_address'])
-
-            sensitive_contracts = set()
-            for contract in result_graph.g.nodes:
-                sensitive_contracts.add(contract)
-
-            unsensitive_contracts = normal_contracts - sensitive_contracts
-
-            l.debug("save index of %s", call_tree.tx.tx_hash)
-            if len(sensitive_contracts) > 0:
-                db_cache.append((call_tree.tx.tx_hash,
-                                 call_tree.tx.block_timestamp.date(),
-                                 sensitive_contracts,
-                                 True))
-            if len(unsensitive_contracts) > 0:
-                db_cache.append((call_tree.tx.tx_hash,
-                                 call_tree.tx.block_timestamp.date(),
-                                 unsensitive_contracts,
-                                 False))
-
-            if len(db_cache) > db_cache_len:
-                l.info("insert data from cache to database")
-                for d in db_cache:
-                    tx_index_db.insert_transactions_of_contract(*d)
-
-                tx_index_db.commit()
-                db_cache.clear()
-
-        for d in db_cache:
-            tx_index_db.insert_transactions_of_contract(*d)
-        tx_index_db.commit()
+                    tx_index_db.commit()
+                    db_cache.clear()
+
+            for d in db_cache:
+                tx_index_db.insert_transactions_of_contract(*d)
+            tx_index_db.commit()
+
+            if column_index:
+                tx_index_db.create_contract_index()
 
-        if column_index:
-            tx_index_db.create_contract_index()
+    def _build_local_index(self, tx_index_db, pre_process, processes, merge_fan_in):
+        tx_index_db.create_index_progress_table()
+        tx_index_db.commit()
+        indexed_dates = tx_index_db.read_index_progress()
+
+        # traces appended after this are picked up by the next build
+        trace_db = pre_process.database[DatabaseName.TRACE_DATABASE]
+        last_trace_ids = dict()
+        for date in trace_db.time_range:
+            last_trace_id = trace_db.get_connection(date).read_last_trace_id()
+            if last_trace_id > indexed_dates.get(date, -1):
+                last_trace_ids[date] = last_trace_id
+        dates = list(last_trace_ids)
+        l.info("index %d days, %d days up to date", len(dates), len(trace_db.time_range) - len(dates))
+        if len(dates) == 0:
+            return
+
+        run_folder = tempfile.mkdtemp(prefix="runs-", dir=os.path.dirname(tx_index_db.filepath))
+        # a crash loses at most the runs not merged yet
+        tx_index_db.begin_bulk_load(journal_mode="WAL")
+        try:
+            runs = list()
+            for run in self._day_runs(pre_process, dates, run_folder, processes):
+                runs.append(run)
+                if len(runs) >= merge_fan_in:
+                    self._merge_runs(tx_index_db, runs, last_trace_ids)
+            self._merge_runs(tx_index_db, runs, last_trace_ids)
+        finally:
+            tx_index_db.end_bulk_load()
+            shutil.rmtree(run_folder, ignore_errors=True)
+
+    @staticmethod
+    def _day_runs(pre_process, dates, run_folder, processes):
+        if processes <= 1:
+            for date in dates:
+                yield date, write_day_run(pre_process, date, run_folder)
+            return
+
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(pre_process.worker_args, run_folder)) as pool:
+            yield from pool.imap_unordered(_index_day, dates)
+
+    @staticmethod
+    def _merge_runs(tx_index_db, runs, last_trace_ids):
+        if len(runs) == 0:
+            return
+
+        l.info("merge runs of %d days into %s", len(runs), tx_index_db)
+        tx_index_db.merge_posting_runs(runs)
+        tx_index_db.update_index_progress([(date, last_trace_ids[date]) for date, _ in runs])
+        tx_index_db.commit()
+        for _, filepath in runs:
+            os.remove(filepath)
+        runs.clear()
@@ -1,3 +1,4 @@
+from .compact_tree import CompactTree
 from .action_tree import ActionTree
 from .result_graph import ResultGraph
 from .transaction import Transaction
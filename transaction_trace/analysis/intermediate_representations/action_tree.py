@@ -1,5 +1,5 @@
-import networkx as nx
-
+from .compact_tree import CompactTree, TraceColumns, encode_node
+from .result_graph import ResultGraph
 from .transaction import Transaction
 
 
@@ -15,19 +15,13 @@ class ActionTree:
 
     @staticmethod
     def encode_node(trace_id, address):
-        return str(trace_id) + ":" + address
-
-    @staticmethod
-    def extract_address_from_node(node):
-        return node.split(":")[1]
+        return encode_node(trace_id, address)
 
-    @staticmethod
-    def extract_trace_id_from_node(node):
-        return node.split(":")[0]
-
-    def __init__(self, tx, tree, errs, created_contracts, destructed_contracts):
+    def __init__(self, tx, tree, errs, created_contracts, destructed_contracts, results=None):
         self.tx = tx
         self.t = tree
+        # results of every trace, by the row of its edge
+        self.results = results
         self.errs = errs
         self.created_contracts = created_contracts
         self.destructed_contracts = destructed_contracts
@@ -41,21 +35,14 @@ class ActionTree:
 
     @staticmethod
     def get_ancestors_from_tree(tree, entry):
-        ancestors = set()
-        while entry != None:
-            parent_edges = list(tree.in_edges(entry))
-            if len(parent_edges) == 0:
-                entry = None
-            else:
-                entry = parent_edges[0][0]
-                node = ActionTree.extract_address_from_node(entry)
-                ancestors.add(node)
-        return ancestors
+        return {tree.address(node) for node in tree.ancestors(entry)}
 
     @staticmethod
     def build_action_tree(traces, subtraces):
         tx = None
-        tree = nx.DiGraph()
+        tree = CompactTree()
+        trace_columns = TraceColumns()
+        results = list()
         errs = list()
         created_contracts = dict()
         destructed_contracts = dict()
@@ -78,11 +65,9 @@ class ActionTree:
             # when A delegatecalls B, the msg.sender is still A
             # so it just like that A copys the code of B and calls its own code
             if trace['trace_type'] == 'call' and trace['call_type'] == 'delegatecall':
-                from_node = ActionTree.encode_node(parent_trace_id, trace['from_address'])
-                to_node = ActionTree.encode_node(trace_id, trace['from_address'])
+                to_address = trace['from_address']
             else:
-                from_node = ActionTree.encode_node(parent_trace_id, trace['from_address'])
-                to_node = ActionTree.encode_node(trace_id, trace['to_address'])
+                to_address = trace['to_address']
 
             if trace['status'] == 0:
                 errs.append(dict(trace))
@@ -99,6 +84,10 @@ class ActionTree:
                         "value": trace['value'],
                     }
 
-            tree.add_edge(from_node, to_node, **dict(trace))
+            tree.add_edge(parent_trace_id, trace['from_address'], trace_id, to_address, len(trace_columns))
+            trace_columns.append(trace)
+            results.append(ResultGraph.trace_results(trace))
+
+        tree.finalize(trace_columns)
 
-        return ActionTree(tx, tree, errs, created_contracts, destructed_contracts)
+        return ActionTree(tx, tree, errs, created_contracts, destructed_contracts, results)
@@ -0,0 +1,298 @@
+from array import array
+
+
+def encode_node(trace_id, address):
+    return str(trace_id) + ":" + address
+
+
+class TraceView:
+    """
+    Read-only mapping over one row of TraceColumns.
+    """
+
+    __slots__ = ('_columns', '_row')
+
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._columns[key][self._row]
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def keys(self):
+        return self._columns.keys()
+
+    def get(self, key, default=None):
+        if key not in self._columns:
+            return default
+        return self._columns[key][self._row]
+
+    def items(self):
+        for key, column in self._columns.items():
+            yield key, column[self._row]
+
+
+class TraceColumns:
+    """
+    Column-wise storage of the trace rows of a transaction, one row per tree edge.
+    """
+
+    __slots__ = ('_columns', '_length')
+
+    def __init__(self):
+        self._columns = None
+        self._length = 0
+
+    def append(self, trace):
+        if self._columns is None:
+            self._columns = {key: list() for key in trace.keys()}
+        for key, column in self._columns.items():
+            column.append(trace[key])
+        self._length += 1
+
+    def __getitem__(self, row):
+        return TraceView(self._columns, row)
+
+    def __len__(self):
+        return self._length
+
+
+class EdgeView:
+    """
+    networkx-like access to the edges of a CompactTree: `tree.edges()`, `tree.edges(node)`, `tree.edges[e]`.
+    """
+
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    def __call__(self, node=None):
+        if node is None:
+            return self
+        return self._tree.out_edges(node)
+
+    def __iter__(self):
+        tree = self._tree
+        offsets = tree._child_offsets
+        children = tree._children
+        for node in range(len(tree._keys)):
+            for i in range(offsets[node], offsets[node + 1]):
+                yield node, children[i]
+
+    def __len__(self):
+        return len(self._tree._children)
+
+    def __contains__(self, e):
+        return 0 <= e[1] < len(self._tree._keys) and self._tree._parent[e[1]] == e[0]
+
+    def __getitem__(self, e):
+        return self._tree._edge_data[self._tree._edge_row[e[1]]]
+
+
+class CompactTree:
+    """
+    Array-backed rooted tree with integer node ids.
+
+    Every node except the root has exactly one in-edge, so an edge is stored with its child node: `_parent[v]` is the
+    parent of v and `_edge_row[v]` the row of the edge (u, v) in `_edge_data`. Children are kept in CSR layout
+    (`_child_offsets`, `_children`) in insertion order, so edges are iterated in the same order as a networkx DiGraph
+    built by the same sequence of `add_edge` calls.
+    """
+
+    __slots__ = ('_keys', '_addresses', '_parent', '_edge_row', '_child_offsets', '_children', '_edge_data',
+                 '_index')
+
+    def __init__(self):
+        self._keys = list()
+        self._addresses = list()
+        self._parent = array('l')
+        self._edge_row = array('l')
+        self._child_offsets = None
+        self._children = None
+        self._edge_data = None
+
+        self._index = dict()
+
+    def __getstate__(self):
+        # slots of subclasses included
+        return {slot: getattr(self, slot) for cls in type(self).__mro__ for slot in getattr(cls, '__slots__', ())}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def _add_node(self, key, address):
+        node = self._index.get(key)
+        if node is None:
+            node = len(self._keys)
+            self._index[key] = node
+            self._keys.append(key)
+            self._addresses.append(address)
+            self._parent.append(-1)
+            self._edge_row.append(-1)
+        return node
+
+    def add_edge(self, parent_key, parent_address, child_key, child_address, row):
+        """
+        `parent_address` is only used if the parent has not been added by its own edge.
+        """
+        parent = self._add_node(parent_key, parent_address)
+        child = self._add_node(child_key, child_address)
+        self._addresses[child] = child_address
+        self._parent[child] = parent
+        self._edge_row[child] = row
+
+    def finalize(self, edge_data):
+        """
+        Lay out the children of every node and attach the edge data. No edge can be added afterwards.
+        """
+        node_number = len(self._keys)
+        counts = array('l', [0]) * (node_number + 1)
+        for node in range(node_number):
+            if self._parent[node] >= 0:
+                counts[self._parent[node] + 1] += 1
+        for node in range(node_number):
+            counts[node + 1] += counts[node]
+
+        # children are placed by edge insertion order, i.e. by their row
+        edges = array('l', [0]) * counts[node_number]
+        for node in range(node_number):
+            if self._parent[node] >= 0:
+                edges[self._edge_row[node]] = node
+        children = array('l', [0]) * len(edges)
+        fill = array('l', counts)
+        for node in edges:
+            parent = self._parent[node]
+            children[fill[parent]] = node
+            fill[parent] += 1
+
+        self._child_offsets = counts
+        self._children = children
+        self._edge_data = edge_data
+        self._index = None
+
+    def with_edge_data(self, edge_data):
+        """
+        A tree sharing the same structure, with other data attached to its edges.
+        """
+        tree = CompactTree.__new__(CompactTree)
+        tree._keys = self._keys
+        tree._addresses = self._addresses
+        tree._parent = self._parent
+        tree._edge_row = self._edge_row
+        tree._child_offsets = self._child_offsets
+        tree._children = self._children
+        tree._edge_data = edge_data
+        tree._index = None
+        return tree
+
+    @property
+    def nodes(self):
+        return range(len(self._keys))
+
+    @property
+    def edges(self):
+        return EdgeView(self)
+
+    def number_of_nodes(self):
+        return len(self._keys)
+
+    def number_of_edges(self):
+        return len(self._children)
+
+    def address(self, node):
+        return self._addresses[node]
+
+    def trace_id(self, node):
+        return self._keys[node]
+
+    def label(self, node):
+        return encode_node(self._keys[node], self._addresses[node])
+
+    def parent(self, node):
+        parent = self._parent[node]
+        return None if parent < 0 else parent
+
+    def successors(self, node):
+        return self._children[self._child_offsets[node]:self._child_offsets[node + 1]]
+
+    def out_edges(self, node):
+        return [(node, child) for child in self.successors(node)]
+
+    def in_edges(self, node):
+        parent = self._parent[node]
+        return [] if parent < 0 else [(parent, node)]
+
+    def in_degree(self):
+        for node in range(len(self._keys)):
+            yield node, 0 if self._parent[node] < 0 else 1
+
+    def ancestors(self, node):
+        """
+        Ancestors of the node, the nearest first.
+        """
+        ancestors = list()
+        parent = self._parent[node]
+        while parent >= 0:
+            ancestors.append(parent)
+            parent = self._parent[parent]
+        return ancestors
+
+    def preorder(self):
+        """
+        Child nodes of all edges in depth-first preorder from every root, and for every node the range
+        [first[node], last[node]) of the edges of its subtree in that order. `dfs_edges(node)` yields the same edges.
+        """
+        node_number = len(self._keys)
+        offsets = self._child_offsets
+        children = self._children
+        edges = array('l')
+        first = array('l', [0]) * node_number
+        last = array('l', [0]) * node_number
+        for root in range(node_number):
+            if self._parent[root] >= 0:
+                continue
+            first[root] = len(edges)
+            stack = [(root, offsets[root])]
+            while len(stack) > 0:
+                node, i = stack[-1]
+                if i == offsets[node + 1]:
+                    last[node] = len(edges)
+                    stack.pop()
+                    continue
+                stack[-1] = (node, i + 1)
+                child = children[i]
+                edges.append(child)
+                first[child] = len(edges)
+                stack.append((child, offsets[child]))
+        return edges, first, last
+
+    def dfs_edges(self, source):
+        """
+        Edges of the subtree rooted at source in depth-first preorder, as networkx.dfs_edges does.
+        """
+        offsets = self._child_offsets
+        children = self._children
+        stack = [(source, offsets[source])]
+        while len(stack) > 0:
+            node, i = stack[-1]
+            if i == offsets[node + 1]:
+                stack.pop()
+                continue
+            stack[-1] = (node, i + 1)
+            child = children[i]
+            yield node, child
+            stack.append((child, offsets[child]))
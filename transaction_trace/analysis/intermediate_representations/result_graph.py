@@ -1,11 +1,14 @@
 import logging
+from array import array
+from bisect import bisect_left
+from functools import reduce
+from operator import add
 
 import networkx as nx
-from networkx.algorithms.traversal import dfs_edges
 
 from ..knowledge import SensitiveAPIs
 from ..results import ResultType
-from .action_tree import ActionTree
+from .compact_tree import CompactTree
 from .transaction import Transaction
 
 l = logging.getLogger(
@@ -23,6 +26,194 @@ def invalid_contract_address(addr):
     return addr.startswith("0x0000000000000000000000000000000000")
 
 
+class PrefixSums:
+    """
+    Amounts added to keys at increasing positions, summed over any range of positions with two lookups.
+
+    Keys whose amounts are not all integers are summed in order over the range instead, so floats and decimals add
+    up exactly as they would one by one.
+    """
+
+    __slots__ = ('_positions', '_amounts', '_prefix')
+
+    def __init__(self):
+        self._positions = dict()
+        self._amounts = dict()
+        self._prefix = None
+
+    def add(self, key, position, amount):
+        if key not in self._positions:
+            self._positions[key] = array('l')
+            self._amounts[key] = list()
+        self._positions[key].append(position)
+        self._amounts[key].append(amount)
+
+    def freeze(self):
+        self._prefix = dict()
+        for key, amounts in self._amounts.items():
+            if all(type(amount) is int for amount in amounts):
+                prefix = [0]
+                for amount in amounts:
+                    prefix.append(prefix[-1] + amount)
+                self._prefix[key] = prefix
+
+    def total(self, key, lo, hi):
+        """
+        Sum of the amounts of the key at positions in [lo, hi), None if it has none or they are None.
+        """
+        positions = self._positions.get(key)
+        if positions is None:
+            return None
+        i = bisect_left(positions, lo)
+        j = bisect_left(positions, hi)
+        if i == j:
+            return None
+
+        prefix = self._prefix.get(key)
+        if prefix is not None:
+            return prefix[j] - prefix[i]
+        amounts = self._amounts[key][i:j]
+        if any(amount is None for amount in amounts):
+            return None
+        return reduce(add, amounts)
+
+
+class ResultTree(CompactTree):
+    """
+    Action tree with the results of every trace on its edges.
+
+    The edges with results are kept in depth-first preorder, so those of any subtree are a contiguous range and
+    `result_edges(node)` does not walk the subtree. On the first balance query, the transfers of these edges are
+    indexed by prefix sums per (address, result type) and per (src, dst, result type), so the balances of a subtree
+    are read from the range instead of being summed into a new graph.
+    """
+
+    __slots__ = ('_result_edges', '_result_first', '_result_last', '_transfers', '_balance_sums', '_transfer_sums')
+
+    def __init__(self, tree, results):
+        for slot in CompactTree.__slots__:
+            setattr(self, slot, getattr(tree, slot))
+        self._edge_data = results
+        self._transfers = self._balance_sums = self._transfer_sums = None
+
+        edges, first, last = self.preorder()
+        # number of edges with results before every preorder position
+        counts = array('l', [0]) * (len(edges) + 1)
+        self._result_edges = array('l')
+        for i, child in enumerate(edges):
+            if len(results[self._edge_row[child]]) > 0:
+                self._result_edges.append(child)
+            counts[i + 1] = len(self._result_edges)
+        self._result_first = array('l', (counts[i] for i in first))
+        self._result_last = array('l', (counts[i] for i in last))
+
+    def result_edges(self, node):
+        """
+        Edges with results in the subtree of the node, in the order of `dfs_edges(node)`.
+        """
+        parent = self._parent
+        for i in range(self._result_first[node], self._result_last[node]):
+            child = self._result_edges[i]
+            yield parent[child], child
+
+    def __getstate__(self):
+        # the balance index is rebuilt on demand
+        state = super(ResultTree, self).__getstate__()
+        state['_transfers'] = state['_balance_sums'] = state['_transfer_sums'] = None
+        return state
+
+    def edge_transfers(self, e):
+        """
+        (src, dst, result type, amount) of the results of an edge, as build_partial_result_graph adds them.
+        """
+        transfers = list()
+        results = self.edges[e]
+        for result_type in results:
+            if result_type == ResultType.ETHER_TRANSFER:
+                src = self.address(e[0])
+                dst = self.address(e[1])
+                if src != dst:
+                    transfers.append((src, dst, result_type, results[result_type]))
+            elif result_type == ResultType.TOKEN_TRANSFER:
+                token_result_type = f"{result_type}:{self.address(e[1])}"
+                for (src, dst, amount) in results[result_type]:
+                    if src != dst:
+                        transfers.append((src, dst, token_result_type, amount))
+            else:  # ResultType.OWNER_CHANGE
+                for (src, dst, amount) in results[result_type]:
+                    transfers.append((src, dst, result_type, None))
+        return transfers
+
+    def _build_balance_index(self):
+        self._transfers = list()
+        self._balance_sums = PrefixSums()
+        self._transfer_sums = PrefixSums()
+        parent = self._parent
+        for i, child in enumerate(self._result_edges):
+            transfers = self.edge_transfers((parent[child], child))
+            self._transfers.append(transfers)
+            for src, dst, result_type, amount in transfers:
+                if result_type != ResultType.OWNER_CHANGE:
+                    self._balance_sums.add((src, result_type), i, -amount)
+                self._balance_sums.add((dst, result_type), i, amount)
+                self._transfer_sums.add((src, dst, result_type), i, amount)
+        self._balance_sums.freeze()
+        self._transfer_sums.freeze()
+
+    def _subtree_layout(self, node):
+        """
+        Addresses with their result types, and (src, dst) with their result types, in the order of the nodes and
+        edges of the partial result graph of the subtree.
+        """
+        if self._transfers is None:
+            self._build_balance_index()
+
+        nodes = dict()
+        successors = dict()
+        for i in range(self._result_first[node], self._result_last[node]):
+            for src, dst, result_type, _ in self._transfers[i]:
+                nodes.setdefault(src, dict())
+                nodes.setdefault(dst, dict())
+                if result_type != ResultType.OWNER_CHANGE:
+                    nodes[src][result_type] = None
+                nodes[dst][result_type] = None
+                successors.setdefault(src, dict()).setdefault(dst, dict())[result_type] = None
+
+        edges = dict()
+        for src in nodes:
+            for dst, result_types in successors.get(src, {}).items():
+                edges[(src, dst)] = result_types
+        return nodes, edges
+
+    def subtree_balance(self, node, address, result_type):
+        """
+        Balance of the address for the result type over the subtree of the node, None if it has none.
+        """
+        if self._transfers is None:
+            self._build_balance_index()
+        return self._balance_sums.total((address, result_type), self._result_first[node], self._result_last[node])
+
+    def subtree_balances(self, node):
+        """
+        Address -> result type -> balance over the subtree of the node, the node data of its partial result graph.
+        """
+        lo, hi = self._result_first[node], self._result_last[node]
+        nodes, _ = self._subtree_layout(node)
+        return {address: {result_type: self._balance_sums.total((address, result_type), lo, hi)
+                          for result_type in result_types}
+                for address, result_types in nodes.items()}
+
+    def subtree_transfers(self, node):
+        """
+        (src, dst) -> result type -> amount over the subtree of the node, the edge data of its partial result graph.
+        """
+        lo, hi = self._result_first[node], self._result_last[node]
+        _, edges = self._subtree_layout(node)
+        return {e: {result_type: self._transfer_sums.total((e[0], e[1], result_type), lo, hi)
+                    for result_type in result_types}
+                for e, result_types in edges.items()}
+
+
 class ResultGraph:
 
     def __init__(self, tx, tree, graph):
@@ -58,41 +249,42 @@ class ResultGraph:
             graph.nodes[dst][result_type] += amount
 
     @staticmethod
-    def build_result_tree(action_tree):
-        tree = nx.DiGraph()
-
-        for e in action_tree.t.edges():
-            tree.add_edge(*e)
-            trace = action_tree.t.edges[e]
-
-            if trace['status'] == 0:  # error trace will not cause any results
-                continue
-
-            if trace['value'] > 0:  # check ether transfer
-                result_type = ResultType.ETHER_TRANSFER
-                amount = trace['value']
-                tree.edges[e][result_type] = amount
-            elif SensitiveAPIs.sensitive_function_call(trace['input']):
-                # check input data for token transfer and owner change
-                for result_type, src, dst, amount in SensitiveAPIs.get_result_details(trace):
-                    if result_type is None:
-                        continue
-                    if result_type not in tree.edges[e]:
-                        tree.edges[e][result_type] = list()
-                    tree.edges[e][result_type].append((src, dst, amount))
+    def trace_results(trace):
+        """
+        Results caused by a trace, computed by ActionTree.build_action_tree as the trace is added.
+        """
+        results = dict()
+
+        if trace['status'] == 0:  # error trace will not cause any results
+            return results
+
+        if trace['value'] > 0:  # check ether transfer
+            results[ResultType.ETHER_TRANSFER] = trace['value']
+        elif SensitiveAPIs.sensitive_function_call(trace['input']):
+            # check input data for token transfer and owner change
+            for result_type, src, dst, amount in SensitiveAPIs.get_result_details(trace):
+                if result_type is None:
+                    continue
+                if result_type not in results:
+                    results[result_type] = list()
+                results[result_type].append((src, dst, amount))
+
+        return results
 
-        return tree
+    @staticmethod
+    def build_result_tree(action_tree):
+        return ResultTree(action_tree.t, action_tree.results)
 
     @staticmethod
     def build_partial_result_graph(result_tree, entry, direct_edges=None):
         graph = nx.DiGraph()
 
-        edges = direct_edges if direct_edges is not None else dfs_edges(result_tree, entry)
+        edges = direct_edges if direct_edges is not None else result_tree.result_edges(entry)
         for e in edges:
             for result_type in result_tree.edges[e]:
                 if result_type == ResultType.ETHER_TRANSFER:
-                    src = ActionTree.extract_address_from_node(e[0])
-                    dst = ActionTree.extract_address_from_node(e[1])
+                    src = result_tree.address(e[0])
+                    dst = result_tree.address(e[1])
                     if src == dst:
                         continue
                     amount = result_tree.edges[e][result_type]
@@ -101,7 +293,7 @@ class ResultGraph:
                         src, dst, amount, result_type, graph)
 
                 elif result_type == ResultType.TOKEN_TRANSFER:
-                    token_address = ActionTree.extract_address_from_node(e[1])
+                    token_address = result_tree.address(e[1])
                     for (src, dst, amount) in result_tree.edges[e][result_type]:
                         if src == dst:
                             continue
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from ...basic_utils import DatetimeUtils
 
 
@@ -9,7 +11,7 @@ class Transaction:
         self.block_number = block_number
         self.tx_index = tx_index
 
-        self.block_timestamp = block_timestamp
+        self._block_timestamp = block_timestamp
         self.block_hash = block_hash
 
         self.caller = caller
@@ -20,3 +22,10 @@ class Transaction:
 
     def __repr__(self):
         return "meta-data of transaction %s" % self.tx_hash
+
+    @property
+    def block_timestamp(self):
+        # connections with raw types return timestamps as text, only parse those actually used
+        if isinstance(self._block_timestamp, str):
+            self._block_timestamp = datetime.fromisoformat(self._block_timestamp)
+        return self._block_timestamp
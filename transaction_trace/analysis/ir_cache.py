@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import pickle
+
+l = logging.getLogger("transaction-trace.analysis.IRCache")
+
+IR_CACHE_VERSION = 3
+
+
+def source_signature(filepath, with_hash=False):
+    stat = os.stat(filepath)
+    signature = {
+        "filepath": os.path.abspath(filepath),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+    if with_hash:
+        h = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        signature["sha1"] = h.hexdigest()
+    return signature
+
+
+class IRCache:
+    """
+    Per-day cache of the (action tree, result graph) pairs built by PreProcess.
+
+    A cache file starts with a header holding the signatures of the source databases, followed by one pickled record
+    per transaction. It is only replayed if the sources are unchanged, by mtime and size, or also by content hash with
+    `with_hash`.
+    """
+
+    def __init__(self, cache_folder, with_hash=False):
+        self.cache_folder = cache_folder
+        self.with_hash = with_hash
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def __repr__(self):
+        return "ir cache in %s" % self.cache_folder
+
+    def cache_filepath(self, date):
+        return os.path.join(self.cache_folder, "ir_%s.pickle" % date)
+
+    def header(self, sources):
+        return {
+            "version": IR_CACHE_VERSION,
+            "sources": [source_signature(filepath, self.with_hash) for filepath in sources],
+        }
+
+    def load(self, date, sources):
+        """
+        Return a generator replaying the cached records of the day, or None if there is no valid cache.
+        """
+        filepath = self.cache_filepath(date)
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, 'rb') as f:
+            try:
+                header = pickle.load(f)
+            except Exception as e:
+                l.warning("broken ir cache %s: %s", filepath, e)
+                return None
+
+        if header != self.header(sources):
+            l.info("outdated ir cache %s", filepath)
+            return None
+
+        return self._replay(filepath)
+
+    @staticmethod
+    def _replay(filepath):
+        with open(filepath, 'rb') as f:
+            pickle.load(f)  # header
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                yield record
+
+    def dump(self, date, sources, records):
+        """
+        Pass the records through while writing them into the cache of the day.
+
+        Records are pickled before they are yielded, so later changes by the checkers are not cached. The cache file
+        only replaces the old one once all records have been consumed.
+        """
+        filepath = self.cache_filepath(date)
+        tmp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+        completed = False
+        try:
+            with open(tmp_filepath, 'wb') as f:
+                pickle.dump(self.header(sources), f, pickle.HIGHEST_PROTOCOL)
+                for record in records:
+                    pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+                    yield record
+            os.replace(tmp_filepath, filepath)
+            completed = True
+            l.info("ir cache of %s written to %s", date, filepath)
+        finally:
+            if not completed and os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
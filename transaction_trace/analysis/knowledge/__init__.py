@@ -1 +1,2 @@
-from .sensitive_apis import SensitiveAPIs, extract_function_signature
+from .sensitive_apis import SensitiveAPIs, SensitiveFunction, extract_function_signature
+from .signature_database import SignatureDatabase
@@ -1,10 +1,13 @@
 import binascii
 import logging
+from functools import lru_cache
 
-from eth_abi import decode_abi, decoding
+from eth_abi import decoding
 from eth_abi.registry import BaseEquals, registry
 
+from ...basic_utils import LRUCache
 from ..results import ResultType
+from .signature_database import SignatureDatabase
 
 l = logging.getLogger("transaction-trace.analysis.knowledge.SensitiveAPIs")
 
@@ -71,14 +74,60 @@ registry.register_decoder(
 )
 
 
+# repeated payloads, e.g. airdrops, are decoded once
+DECODE_CACHE_SIZE = 8192
+
+# selectors looked up in the signature database, including the misses
+SIGNATURE_CACHE_SIZE = 65536
+
+_missing = object()
+
+
+def _parameter_types(func_name):
+    return func_name.split('(')[1].split(')')[0].split(',')
+
+
+def _decode_transfer(data):
+    # transfer(address,uint256)
+    return '0x' + data[12:32].hex(), int.from_bytes(data[32:64], 'big')
+
+
+def _decode_transfer_from(data):
+    # transferFrom(address,address,uint256)
+    return '0x' + data[12:32].hex(), '0x' + data[44:64].hex(), int.from_bytes(data[64:96], 'big')
+
+
+# functions with only static parameters, decoded by slicing their words if the input holds all of them
+_static_decoders = {
+    '0xa9059cbb': (64, _decode_transfer),
+    '0x23b872dd': (96, _decode_transfer_from),
+}
+
+_decoders = dict()
+
+
+def _parameter_decoder(func_name):
+    """
+    Equivalent of `decode_abi` with the parameter types of the function, built once per function.
+    """
+    if func_name not in _decoders:
+        tuple_decoder = decoding.TupleDecoder(
+            decoders=[registry.get_decoder(t) for t in _parameter_types(func_name)])
+        _decoders[func_name] = lambda data: tuple_decoder(decoding.ContextFramesBytesIO(data))
+    return _decoders[func_name]
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
 def _extract_function_parameters(func_name, input_data):
     if input_data is None:
         return None
 
-    paras = func_name.split('(')[1].split(')')[0].split(',')
-
     try:
-        res = decode_abi(paras, bytes.fromhex(input_data[10:]))
+        data = bytes.fromhex(input_data[10:])
+        sig = input_data[:10]
+        if sig in _static_decoders and len(data) >= _static_decoders[sig][0]:
+            return _static_decoders[sig][1](data)
+        res = _parameter_decoder(func_name)(data)
     except Exception as e:
         l.exception(e)
         return None
@@ -86,6 +135,30 @@ def _extract_function_parameters(func_name, input_data):
     return res
 
 
+class SensitiveFunction:
+    """
+    A function whose calls cause results, with everything needed to classify and decode its calls.
+    """
+
+    __slots__ = ('selector', 'category', 'signature', 'param_index', 'integer_overflow', 'encoded_name')
+
+    def __init__(self, selector, category, signature, param_index, integer_overflow=False):
+        self.selector = selector
+        self.category = category
+        self.signature = signature
+        # index of the owner parameter, or of the ([from,] to, amount) parameters of token transfers
+        self.param_index = param_index
+        self.integer_overflow = integer_overflow
+        # hex encoded signature, as it appears in the input of calls passing the function name
+        self.encoded_name = binascii.b2a_hex(signature.encode("utf-8")).decode()
+
+    def __repr__(self):
+        return "sensitive function %s %s" % (self.selector, self.signature)
+
+    def decode(self, input_data):
+        return _extract_function_parameters(self.signature, input_data)
+
+
 class SensitiveAPIs:
 
     _integer_overflow_sensitive_functions = {
@@ -123,8 +196,6 @@ class SensitiveAPIs:
         }
     }
 
-    _encoded_functions = None
-
     _sensitive_para_index = {
         # owner: index of owner_contract
         '0x13af4035': 0,
@@ -148,89 +219,168 @@ class SensitiveAPIs:
         '0x1e89d545': (0, 1)
     }
 
+    _registry = None
+    _encoded_functions = None
+
+    _signature_database = None
+    _signature_cache = None
+
+    @classmethod
+    def registry(cls):
+        """
+        Selector -> SensitiveFunction, built once from the tables above.
+        """
+        if cls._registry is None:
+            registry = dict()
+            for category in cls._sensitive_functions:
+                for selector, signature in cls._sensitive_functions[category].items():
+                    registry[selector] = SensitiveFunction(
+                        selector, category, signature, cls._sensitive_para_index[selector],
+                        signature in cls._integer_overflow_sensitive_functions)
+            cls._registry = registry
+
+        return cls._registry
+
+    @classmethod
+    def load_signature_database(cls, db_filepath):
+        """
+        Also recognize the sensitive functions of a database compiled by `SignatureDatabase.compile`. The functions
+        above take precedence over the database.
+
+        The database is memory-mapped rather than loaded, load it before forking worker processes so they share it.
+        """
+        if cls._signature_database is not None:
+            cls._signature_database.close()
+        cls._signature_database = SignatureDatabase(db_filepath)
+        cls._signature_cache = LRUCache(SIGNATURE_CACHE_SIZE)
+        l.info("load %d signatures from %s", len(cls._signature_database), db_filepath)
+
+    @classmethod
+    def knowledge_sources(cls):
+        """
+        Files the recognized functions are loaded from, for caches of results depending on them.
+        """
+        return (cls._signature_database.filepath,) if cls._signature_database is not None else ()
+
+    @classmethod
+    def function(cls, selector):
+        """
+        The sensitive function with the selector, or None.
+        """
+        # e.g. suicide traces have no input
+        if not isinstance(selector, str):
+            return None
+
+        function = cls.registry().get(selector)
+        if function is not None or cls._signature_database is None:
+            return function
+
+        function = cls._signature_cache.get(selector, _missing)
+        if function is _missing:
+            function = cls._load_function(selector)
+            cls._signature_cache.put(selector, function)
+        return function
+
+    @classmethod
+    def _load_function(cls, selector):
+        if not selector.startswith('0x') or len(selector) != 10:
+            return None
+        try:
+            key = bytes.fromhex(selector[2:])
+        except ValueError:
+            return None
+        for _, category, signature, param_index in cls._signature_database.sensitive_functions_of(key):
+            # a selector colliding with several sensitive functions decodes as the first one
+            return SensitiveFunction(selector, category, signature, param_index)
+        return None
+
+    @classmethod
+    def lookup(cls, input_data):
+        """
+        The sensitive function called by the input data, or None.
+        """
+        return cls.function(extract_function_signature(input_data))
+
     @classmethod
     def encoded_functions(cls):
+        """
+        Category -> selector -> encoded name of the functions above, built once from the registry.
+        """
         if cls._encoded_functions is None:
-            cls._encoded_functions = {
+            encoded_functions = {
                 'owner': {},
                 'token': {},
             }
-            for t in cls._sensitive_functions:
-                for sig in cls._sensitive_functions[t]:
-                    cls._encoded_functions[t][sig] = binascii.b2a_hex(
-                        cls._sensitive_functions[t][sig].encode("utf-8")).decode()
+            for selector, function in cls.registry().items():
+                encoded_functions[function.category][selector] = function.encoded_name
+            cls._encoded_functions = encoded_functions
 
         return cls._encoded_functions
 
     @classmethod
     def func_name(cls, input_data):
         callee = extract_function_signature(input_data)
-        for t in cls._sensitive_functions:
-            if callee in cls._sensitive_functions[t]:
-                return cls._sensitive_functions[t][callee]
+        function = cls.function(callee)
+        if function is not None:
+            return function.signature
+        if cls._signature_database is not None and callee != '0xfallback':
+            return cls._signature_database.signature(callee) or callee
         return callee
 
     @classmethod
     def owner_change_functions(cls):
-        return cls._encoded_functions['owner']
+        return cls.encoded_functions()['owner']
 
     @classmethod
     def token_transfer_functions(cls):
-        return cls._encoded_functions['token']
+        return cls.encoded_functions()['token']
 
     @classmethod
     def sensitive_function_call(cls, input_data):
-        callee = extract_function_signature(input_data)
-        return callee in cls._sensitive_functions['owner'] or callee in cls._sensitive_functions['token']
+        return cls.lookup(input_data) is not None
 
     @classmethod
     def token_transfer_call(cls, input_data):
-        callee = extract_function_signature(input_data)
-        return callee in cls._sensitive_functions['token']
+        function = cls.lookup(input_data)
+        return function is not None and function.category == 'token'
 
     @classmethod
     def get_result_details(cls, trace):
         input_data = trace['input']
 
-        result_type = None
         src = trace['from_address']
 
         sig = extract_function_signature(input_data)
-        if sig in cls._sensitive_functions['owner']:
-            func_name = cls._sensitive_functions['owner'][sig]
-            paras = _extract_function_parameters(func_name, input_data)
-            if paras is None:
-                return
+        function = cls.function(sig)
+        if function is None:
+            l.debug("unknown sensitive function signature %s", sig)
+            yield sig, None, None, None
+            return
 
-            _dst = paras[cls._sensitive_para_index[sig]]
+        paras = function.decode(input_data)
+        if paras is None:
+            return
+
+        index = function.param_index
+        if function.category == 'owner':
+            _dst = paras[index]
             if isinstance(_dst, str):
                 yield ResultType.OWNER_CHANGE, src, _dst, None
             else:
                 for dst in _dst:
                     yield ResultType.OWNER_CHANGE, src, dst, None
 
-        elif sig in cls._sensitive_functions['token']:
-            func_name = cls._sensitive_functions['token'][sig]
-            paras = _extract_function_parameters(func_name, input_data)
-            if paras is None:
-                return
-
-            index = cls._sensitive_para_index[sig]
-            if len(index) == 2:  # (to, amount)
-                _dst = paras[index[0]]
-                _amount = paras[index[1]]
-
-                if isinstance(_dst, str):
-                    yield ResultType.TOKEN_TRANSFER, src, _dst, _amount
-                else:
-                    for dst, amount in patched_zip(_dst, _amount):
-                        yield ResultType.TOKEN_TRANSFER, src, dst, amount
-            else:  # (from, to, amount)
-                src = paras[index[0]]
-                dst = paras[index[1]]
-                amount = paras[index[2]]
-                yield ResultType.TOKEN_TRANSFER, src, dst, amount
+        elif len(index) == 2:  # token: (to, amount)
+            _dst = paras[index[0]]
+            _amount = paras[index[1]]
 
-        else:
-            l.debug("unknown sensitive function signature %s", sig)
-            yield sig, None, None, None
+            if isinstance(_dst, str):
+                yield ResultType.TOKEN_TRANSFER, src, _dst, _amount
+            else:
+                for dst, amount in patched_zip(_dst, _amount):
+                    yield ResultType.TOKEN_TRANSFER, src, dst, amount
+        else:  # token: (from, to, amount)
+            src = paras[index[0]]
+            dst = paras[index[1]]
+            amount = paras[index[2]]
+            yield ResultType.TOKEN_TRANSFER, src, dst, amount
@@ -0,0 +1,200 @@
+import json
+import logging
+import re
+import struct
+
+from eth_utils import function_signature_to_4byte_selector
+
+from ...basic_utils import SortedRecordFile, write_sorted_records
+
+l = logging.getLogger("transaction-trace.analysis.knowledge.SignatureDatabase")
+
+CATEGORY_NONE = 0
+CATEGORY_OWNER = 1
+CATEGORY_TOKEN = 2
+
+_categories = {
+    CATEGORY_NONE: None,
+    CATEGORY_OWNER: 'owner',
+    CATEGORY_TOKEN: 'token',
+}
+_category_codes = {v: k for k, v in _categories.items()}
+
+# selector, category, number of parameter indexes, 3 parameter indexes, offset and length of the signature in the blob
+_record = struct.Struct(">4sBBBBBIHx")
+
+_selector_pattern = re.compile(r"^(0x)?[0-9a-fA-F]{8}$")
+
+# names of the functions recognized as sensitive, like the builtin ones of SensitiveAPIs
+_owner_change_names = re.compile(r"^(transferOwnership|setOwner|changeOwner|addOwner|initWallet)$", re.IGNORECASE)
+_token_transfer_names = re.compile(
+    r"^(transfer|transferFrom|transferProxy|transferMulti|multiTransfer|batchTransfers?|mint|mintTo|mintTokens?|"
+    r"multiMint)$", re.IGNORECASE)
+# getters never change state, whatever follows
+_view_prefix = re.compile(r"^(is|get|has|can)([A-Z_0-9]|$)")
+
+
+def parameter_types(signature):
+    types = signature[signature.index('(') + 1:signature.rindex(')')]
+    return types.split(',') if types != "" else []
+
+
+def classify_signature(signature):
+    """
+    Tell from its name and parameter types whether calls to the function change an owner or transfer tokens.
+    Return (category, parameter index) like SensitiveAPIs._sensitive_para_index, or (None, None).
+    """
+    name = signature[:signature.index('(')]
+    types = parameter_types(signature)
+    # tuple parameters are not decoded
+    if any('(' in t or ')' in t for t in types) or _view_prefix.match(name):
+        return None, None
+
+    if _owner_change_names.match(name):
+        if len(types) > 0 and types[0] in ('address', 'address[]'):
+            return 'owner', 0
+        return None, None
+
+    if _token_transfer_names.match(name):
+        if types[:3] == ['address', 'address', 'uint256']:
+            return 'token', (0, 1, 2)
+        if types[:2] in (['address', 'uint256'], ['address[]', 'uint256[]'], ['address[]', 'uint256']):
+            return 'token', (0, 1)
+
+    return None, None
+
+
+def read_signature_source(filepath):
+    """
+    Yield (selector, signature) from a 4byte-style source: a JSON list of {"hex_signature", "text_signature"} or a JSON
+    mapping from selector to signature(s), or a text file with one `[selector] signature` per line.
+    """
+    if filepath.endswith(".json"):
+        with open(filepath) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            for selector, signatures in data.items():
+                for signature in ([signatures] if isinstance(signatures, str) else signatures):
+                    yield selector, signature
+        else:
+            for entry in data:
+                yield entry.get("hex_signature"), entry["text_signature"]
+        return
+
+    with open(filepath) as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            parts = re.split(r"[\s,;]+", line, maxsplit=1)
+            if len(parts) == 2 and _selector_pattern.match(parts[0]):
+                yield parts[0], parts[1]
+            else:
+                yield None, line
+
+
+def normalize_selector(selector, signature):
+    if selector is None:
+        return "0x" + function_signature_to_4byte_selector(signature).hex()
+    selector = selector.lower()
+    return selector if selector.startswith("0x") else "0x" + selector
+
+
+class SignatureDatabase:
+    """
+    Read-only selector -> signatures lookup over a file compiled by `compile`.
+
+    The file is memory-mapped and searched by bisection, so it is shared by worker processes through the page cache
+    instead of being loaded into every one of them.
+    """
+
+    def __init__(self, db_filepath):
+        self._file = SortedRecordFile(db_filepath)
+
+    def __repr__(self):
+        return "signature database %s" % self._file.filepath
+
+    def __len__(self):
+        return len(self._file)
+
+    @property
+    def filepath(self):
+        return self._file.filepath
+
+    def close(self):
+        self._file.close()
+
+    def _decode_record(self, record):
+        selector, category, index_number, i0, i1, i2, offset, length = _record.unpack(record)
+        signature = self._file.blob(offset, length).decode("utf-8")
+        param_index = None
+        if category == CATEGORY_OWNER:
+            param_index = i0
+        elif category == CATEGORY_TOKEN:
+            param_index = (i0, i1, i2)[:index_number]
+        return "0x" + selector.hex(), _categories[category], signature, param_index
+
+    def lookup(self, selector):
+        """
+        All signatures with the selector, as there may be collisions.
+        """
+        key = bytes.fromhex(selector[2:])
+        return [self._decode_record(r)[2] for r in self._file.find(key)]
+
+    def signature(self, selector):
+        signatures = self.lookup(selector)
+        return signatures[0] if len(signatures) > 0 else None
+
+    def sensitive_functions(self):
+        """
+        Yield (selector, category, signature, param_index) of the functions classified as sensitive.
+        """
+        for record in self._file.records():
+            # category byte right after the selector
+            if record[4] != CATEGORY_NONE:
+                yield self._decode_record(record)
+
+    def sensitive_functions_of(self, key):
+        """
+        Same as `sensitive_functions`, only for the 4-byte selector `key`.
+        """
+        for record in self._file.find(key):
+            if record[4] != CATEGORY_NONE:
+                yield self._decode_record(record)
+
+    @staticmethod
+    def compile(source_filepath, db_filepath):
+        """
+        Compile a 4byte-style signature source into a database file.
+        """
+        records = list()
+        blob = bytearray()
+        seen = set()
+        for selector, signature in read_signature_source(source_filepath):
+            try:
+                selector = normalize_selector(selector, signature)
+                category, param_index = classify_signature(signature)
+            except ValueError:
+                l.warning("ignore invalid signature %s", signature)
+                continue
+            if (selector, signature) in seen:
+                continue
+            seen.add((selector, signature))
+
+            if category == 'owner':
+                indexes = (param_index,)
+            elif category == 'token':
+                indexes = param_index
+            else:
+                indexes = ()
+            padded = tuple(indexes) + (0,) * (3 - len(indexes))
+            category = _category_codes[category]
+
+            encoded = signature.encode("utf-8")
+            records.append(_record.pack(bytes.fromhex(selector[2:]), category, len(indexes), *padded,
+                                        len(blob), len(encoded)))
+            blob.extend(encoded)
+
+        write_sorted_records(db_filepath, records, 4, bytes(blob))
+        l.info("compiled %d signatures of %s into %s", len(records), source_filepath, db_filepath)
+        return SignatureDatabase(db_filepath)
@@ -1,10 +1,14 @@
 import logging
+import multiprocessing
 import os
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import groupby
 
-from ..local import DatabaseName
+from ..local import DatabaseBackend, DatabaseName
 from .intermediate_representations import ActionTree, ResultGraph
+from .ir_cache import IRCache
+from .knowledge import SensitiveAPIs
 from .trace_analysis import TraceAnalysis
 
 l = logging.getLogger("transaction-trace.analysis.PreProcess")
@@ -14,57 +18,182 @@ def nested_dictionary():
     return defaultdict(nested_dictionary)
 
 
+_worker_pre_process = None
+
+
+def _init_worker(worker_args):
+    global _worker_pre_process
+    _worker_pre_process = PreProcess.from_worker_args(worker_args)
+
+
+def _preprocess_day(date, streaming):
+    return list(_worker_pre_process.preprocess_day(date, streaming))
+
+
 class PreProcess(TraceAnalysis):
-    def __init__(self, db_folder):
-        super(PreProcess, self).__init__(db_folder, [DatabaseName.TRACE_DATABASE, DatabaseName.TOKEN_TRANSFER_DATABASE])
+    def __init__(self, db_folder, backend=DatabaseBackend.SQLITE, cache_folder=None, read_only=False, raw_types=False):
+        """
+        With `cache_folder`, the IR built for a day is cached there and replayed as long as its source databases are
+        unchanged.
 
-    def preprocess(self):
-        for conn in self.database[DatabaseName.TRACE_DATABASE].get_all_connnections():
-            l.info("construct for %s", conn)
+        `read_only` and `raw_types` select how the day files are opened, see TraceAnalysis.
+        """
+        super(PreProcess, self).__init__(db_folder, [DatabaseName.TRACE_DATABASE, DatabaseName.TOKEN_TRANSFER_DATABASE],
+                                         {DatabaseName.TRACE_DATABASE: backend}, read_only, raw_types)
+        self.db_folder = db_folder
+        self.backend = backend
+        self.read_only = read_only
+        self.raw_types = raw_types
+        self.cache_folder = cache_folder
+        self.ir_cache = IRCache(cache_folder) if cache_folder is not None else None
 
-            token_conn = self.database[DatabaseName.TOKEN_TRANSFER_DATABASE].get_connection(conn.date)
-            token_transfers = defaultdict(list)
-            for row in token_conn.read('token_transfers', '*'):
-                tx_hash = row['transaction_hash']
-                token_transfers[tx_hash].append(row)
+    @property
+    def worker_args(self):
+        """
+        Arguments to rebuild this PreProcess in a worker process with `from_worker_args`.
+        """
+        return (self.db_folder, self.backend, self.cache_folder, self.read_only, self.raw_types,
+                SensitiveAPIs.knowledge_sources())
+
+    @staticmethod
+    def from_worker_args(worker_args):
+        db_folder, backend, cache_folder, read_only, raw_types, knowledge_sources = worker_args
+        # forked workers already share the signature database of the parent, spawned ones map it again
+        for db_filepath in knowledge_sources:
+            if db_filepath not in SensitiveAPIs.knowledge_sources():
+                SensitiveAPIs.load_signature_database(db_filepath)
+        return PreProcess(db_folder, backend, cache_folder, read_only, raw_types)
+
+    def preprocess(self, processes=1, streaming=False):
+        """
+        Yield (action tree, result graph) of every transaction in chain order.
+
+        With `processes` > 1, days are dispatched to a process pool and their results are merged back in date order,
+        so stateful checkers still see transactions ordered by block_number and transaction_index.
+
+        With `streaming`, traces are read one transaction at a time instead of grouping a whole day in memory.
+        """
+        if processes > 1:
+            yield from self._parallel_preprocess(processes, streaming)
+            return
+
+        for date in self.database[DatabaseName.TRACE_DATABASE].time_range:
+            yield from self.preprocess_day(date, streaming)
+
+    def _parallel_preprocess(self, processes, streaming):
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self.worker_args,)) as pool:
+            # only keep a few days in flight so finished days do not pile up in memory
+            pending = deque()
+            for date in self.database[DatabaseName.TRACE_DATABASE].time_range:
+                pending.append(pool.apply_async(_preprocess_day, (date, streaming)))
+                if len(pending) > processes:
+                    yield from pending.popleft().get()
+
+            while len(pending) > 0:
+                yield from pending.popleft().get()
+
+    def preprocess_day(self, date, streaming=False):
+        conn = self.database[DatabaseName.TRACE_DATABASE].get_connection(date)
+        token_conn = self.database[DatabaseName.TOKEN_TRANSFER_DATABASE].get_connection(conn.date)
+
+        if self.ir_cache is None:
+            yield from self._build_day(conn, token_conn, streaming)
+            return
 
-            tx_hashes = nested_dictionary()
-            ordered_traces = nested_dictionary()
-            for row in conn.read_traces(with_rowid=True):
+        # the recognized sensitive functions decide the result graphs
+        sources = (conn.filepath, token_conn.filepath) + SensitiveAPIs.knowledge_sources()
+        records = self.ir_cache.load(conn.date, sources)
+        if records is not None:
+            l.info("replay %s from %s", conn.date, self.ir_cache)
+            yield from records
+        else:
+            yield from self.ir_cache.dump(conn.date, sources, self._build_day(conn, token_conn, streaming))
+
+    def _build_day(self, conn, token_conn, streaming):
+        l.info("construct for %s", conn)
+
+        token_transfers = defaultdict(list)
+        for row in token_conn.read('token_transfers', '*'):
+            tx_hash = row['transaction_hash']
+            token_transfers[tx_hash].append(row)
+
+        if streaming:
+            transactions = self._stream_transactions(conn)
+        else:
+            transactions = self._group_transactions(conn)
+
+        for tx_hash, traces, subtraces in transactions:
+            tree = ActionTree.build_action_tree(traces, subtraces)
+            if tree is not None:
+                l.debug("construct result graph for %s", tx_hash)
+                graph = ResultGraph.build_result_graph(
+                    tree, token_transfers[tx_hash] if tx_hash in token_transfers else None)
+
+                yield tree, graph
+            else:
+                l.debug("invalid action tree for %s", tx_hash)
+                yield None, None
+
+    def _group_transactions(self, conn):
+        tx_hashes = nested_dictionary()
+        ordered_traces = nested_dictionary()
+        for row in conn.read_traces(with_rowid=True):
+            if row['trace_type'] not in ('call', 'create', 'suicide'):
+                l.debug("ignore trace of type %s", row['trace_type'])
+                continue
+
+            block_number = row["block_number"]
+            tx_index = row["transaction_index"]
+            tx_hash = row["transaction_hash"]
+            rowid = row['rowid']
+
+            if block_number is None or tx_index is None:
+                continue
+
+            ordered_traces[block_number][tx_index][rowid] = row
+            tx_hashes[block_number][tx_index] = tx_hash
+
+        subtraces = defaultdict(dict)
+        for row in conn.read_subtraces():
+            tx_hash = row['transaction_hash']
+            trace_id = row['trace_id']
+            parent_trace_id = row['parent_trace_id']
+            subtraces[tx_hash][trace_id] = parent_trace_id
+
+        for block_number in sorted(ordered_traces):
+            for tx_index in sorted(ordered_traces[block_number]):
+                tx_hash = tx_hashes[block_number][tx_index]
+                l.debug("construct action tree for block %s index %s tx %s", block_number, tx_index, tx_hash)
+                yield tx_hash, ordered_traces[block_number][tx_index], subtraces[tx_hash]
+
+    def _stream_transactions(self, conn):
+        """
+        Read the traces already ordered by (block_number, transaction_index, rowid) together with their subtraces,
+        so only one transaction is held in memory at a time.
+        """
+        rows = conn.read_ordered_traces()
+        for (block_number, tx_index), tx_rows in groupby(rows, key=lambda r: (r['block_number'], r['transaction_index'])):
+            if block_number is None or tx_index is None:
+                continue
+
+            traces = dict()
+            ordered_subtraces = list()
+            for row in tx_rows:
                 if row['trace_type'] not in ('call', 'create', 'suicide'):
                     l.debug("ignore trace of type %s", row['trace_type'])
                     continue
 
-                block_number = row["block_number"]
-                tx_index = row["transaction_index"]
-                tx_hash = row["transaction_hash"]
-                rowid = row['rowid']
+                tx_hash = row['transaction_hash']
+                traces[row['rowid']] = row
+                if row['subtrace_order'] is not None:
+                    ordered_subtraces.append(row)
 
-                if block_number is None or tx_index is None:
-                    continue
+            if len(traces) == 0:
+                continue
 
-                ordered_traces[block_number][tx_index][rowid] = row
-                tx_hashes[block_number][tx_index] = tx_hash
+            # build the tree in the same order as the subtraces table
+            ordered_subtraces.sort(key=lambda r: r['subtrace_order'])
+            subtraces = {r['rowid']: r['parent_trace_id'] for r in ordered_subtraces}
 
-            subtraces = defaultdict(dict)
-            for row in conn.read_subtraces():
-                tx_hash = row['transaction_hash']
-                trace_id = row['trace_id']
-                parent_trace_id = row['parent_trace_id']
-                subtraces[tx_hash][trace_id] = parent_trace_id
-
-            for block_number in sorted(ordered_traces):
-                for tx_index in sorted(ordered_traces[block_number]):
-                    tx_hash = tx_hashes[block_number][tx_index]
-                    l.debug("construct action tree for block %s index %s tx %s", block_number, tx_index, tx_hash)
-                    tree = ActionTree.build_action_tree(
-                        ordered_traces[block_number][tx_index], subtraces[tx_hash])
-                    if tree is not None:
-                        l.debug("construct result graph for %s", tx_hash)
-                        graph = ResultGraph.build_result_graph(
-                            tree, token_transfers[tx_hash] if tx_hash in token_transfers else None)
-
-                        yield tree, graph
-                    else:
-                        l.debug("invalid action tree for %s", tx_hash)
-                        yield None, None
+            l.debug("construct action tree for block %s index %s tx %s", block_number, tx_index, tx_hash)
+            yield tx_hash, traces, subtraces
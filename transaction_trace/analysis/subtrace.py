@@ -1,55 +1,133 @@
 import logging
-from collections import defaultdict
+import multiprocessing
+from functools import partial
 
 from ..local import EthereumDatabase
 
 l = logging.getLogger("transaction-trace.analysis.SubtraceBuilder")
 
+_worker_builder = None
 
-def nested_dictionary():
-    return defaultdict(nested_dictionary)
+
+def _init_worker(db_folder, batch_size):
+    global _worker_builder
+    _worker_builder = SubtraceBuilder(db_folder, batch_size)
+
+
+def _build_day(date, incremental=False):
+    _worker_builder.build_day(date, incremental)
+    return date
 
 
 class SubtraceBuilder:
-    def __init__(self, db_folder):
+    def __init__(self, db_folder, batch_size=100000):
+        self.db_folder = db_folder
+        self.batch_size = batch_size
         self.database = EthereumDatabase(db_folder)
 
-    def _build_subtrace(self, db):
-        call_traces = nested_dictionary()
-        for row in db.read_traces(with_rowid=True):
-            tx_hash = row['transaction_hash']
-            trace_id = row['rowid']
-            trace_address = row['trace_address']
-
+    @staticmethod
+    def _link_traces(rows):
+        """
+        Yield (transaction_hash, trace_id, parent_trace_id) in the order of the subtraces table: transactions by first
+        appearance, then levels by first appearance, then traces of a level by first appearance of their trace_address.
+        A later trace with the same trace_address in the same transaction replaces the earlier one.
+        """
+        call_traces = dict()
+        for trace_id, tx_hash, trace_address in rows:
             if trace_address is None:  # unique root node
                 level = 0
                 seq = "0"
-                parent_seq = -1
+                parent_seq = None
             else:
-                trace_addrs = trace_address.split(",")
-                level = len(trace_addrs)
+                level = trace_address.count(",") + 1
                 seq = trace_address
-                parent_seq = "0" if level == 1 else ",".join(trace_addrs[:-1])
+                parent_seq = "0" if level == 1 else trace_address.rpartition(",")[0]
+
+            levels = call_traces.get(tx_hash)
+            if levels is None:
+                levels = call_traces[tx_hash] = dict()
+            seqs = levels.get(level)
+            if seqs is None:
+                seqs = levels[level] = dict()
+            seqs[seq] = (trace_id, parent_seq)
+
+        for tx_hash, levels in call_traces.items():
+            for level, seqs in levels.items():
+                parents = levels.get(level - 1, dict())
+                for trace_id, parent_seq in seqs.values():
+                    if level == 0:
+                        yield tx_hash, trace_id, None
+                    elif parent_seq in parents:
+                        yield tx_hash, trace_id, parents[parent_seq][0]
+                    else:
+                        l.warning("parent of trace %s not found in %s", trace_id, tx_hash)
+                        yield tx_hash, trace_id, None
 
-            call_traces[tx_hash][level][seq] = (trace_id, parent_seq)
+    def _build_subtrace(self, db, after_trace_id=0):
+        """
+        Return the rowid of the last trace read.
+        """
+        last_trace_id = after_trace_id
 
-        for tx_hash in call_traces:
-            # hack for parent of root node
-            call_traces[tx_hash][-1][-1] = (None, None)
-            for level in call_traces[tx_hash]:
-                if level < 0:
-                    continue
+        def trace_addresses():
+            nonlocal last_trace_id
+            for row in db.read_trace_addresses(after_trace_id):
+                last_trace_id = row[0]
+                yield row
 
-                for seq in call_traces[tx_hash][level]:
-                    trace_id, parent_seq = call_traces[tx_hash][level][seq]
-                    db.insert_subtrace(
-                        (tx_hash, trace_id, call_traces[tx_hash][level-1][parent_seq][0]))
+        batch = list()
+        for row in self._link_traces(trace_addresses()):
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                db.insert_subtraces(batch)
+                batch = list()
+        if len(batch) > 0:
+            db.insert_subtraces(batch)
 
-    def build_subtrace(self, from_time, to_time):
-        for db in self.database.get_connections(from_time, to_time):
-            db.create_subtraces_table()
+        return last_trace_id
+
+    def build_day(self, date, incremental=False):
+        """
+        With `incremental`, only the traces appended since the last build of the day are linked. This assumes that
+        traces are appended in whole blocks, as the crawler does, so a transaction never spans two builds. Traces
+        without transaction hash, i.e. rewards, get one subtrace per build instead of one per day.
+
+        An incremental build may run while the crawler is still writing the day, so it leaves the journal mode and
+        the traces index to the crawler, which builds the index once the day is complete.
+        """
+        db = self.database.get_connection(date)
+        if not incremental:
+            db.begin_bulk_load()
+        db.create_subtraces_table()
+        db.create_subtrace_progress_table()
+        if not incremental:
+            db.create_traces_index()
+
+        last_trace_id = db.read_subtrace_progress() if incremental else None
+        if last_trace_id is None:
             db.clear_subtraces()
+            l.info("Building subtrace for %s", db.filepath)
+            last_trace_id = self._build_subtrace(db)
+        else:
+            l.info("Updating subtrace for %s after trace %s", db.filepath, last_trace_id)
+            last_trace_id = self._build_subtrace(db, last_trace_id)
 
-            l.info("Building subtrace for %s", db._filepath)
-            self._build_subtrace(db)
+        db.update_subtrace_progress(last_trace_id)
+        if incremental:
             db.commit()
+        else:
+            db.end_bulk_load()
+
+    def build_subtrace(self, from_time, to_time, processes=1, incremental=False):
+        """
+        With `processes` > 1, days are built in parallel, each one by a single worker.
+        """
+        dates = self.database.get_dates(from_time, to_time)
+        if processes <= 1:
+            for date in dates:
+                self.build_day(date, incremental)
+            return
+
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self.db_folder, self.batch_size)) as pool:
+            for date in pool.imap_unordered(partial(_build_day, incremental=incremental), dates):
+                l.info("subtrace of %s built", date)
@@ -1,17 +1,26 @@
 import os
 
-from ..local import EthereumDatabase
+from ..local import DatabaseBackend, EthereumDatabase
 
 
 class TraceAnalysis:
-    def __init__(self, db_folder=None, db_list=None):
+    def __init__(self, db_folder=None, db_list=None, backends=None, read_only=False, raw_types=False):
+        """
+        `backends` optionally maps a database name to the DatabaseBackend it is stored with, sqlite by default.
+
+        With `read_only`, day files are opened as immutable and their connections are shared between threads. With
+        `raw_types`, sqlite columns are read without type conversion, e.g. timestamps as text.
+        """
         if db_folder != None:
             if db_list == None:
-                self.database = EthereumDatabase(db_folder)
+                self.database = EthereumDatabase(db_folder, read_only=read_only, raw_types=raw_types)
             else:
                 self.database = dict()
                 db_folders = os.listdir(db_folder)
+                backends = dict() if backends is None else backends
                 for db_name in db_list:
                     if f'ethereum_{db_name}' in db_folders:
                         self.database[db_name] = EthereumDatabase(
-                            os.path.join(db_folder, f'ethereum_{db_name}'), db_name)
+                            os.path.join(db_folder, f'ethereum_{db_name}'), db_name,
+                            backend=backends.get(db_name, DatabaseBackend.SQLITE), read_only=read_only,
+                            raw_types=raw_types)
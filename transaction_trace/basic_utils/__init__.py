@@ -1 +1,3 @@
 from .datetime_utils import DatetimeUtils
+from .lru_cache import LRUCache
+from .sorted_records import SortedRecordFile, write_sorted_records
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded mapping which evicts the least recently used entry, with O(1) get and put.
+
+    `on_evict(key, value)` is called for every entry dropped from the cache, including those removed by `clear`.
+
+    With `weigh(value)`, e.g. `len`, the capacity bounds the total weight of the entries instead of their number.
+    """
+
+    def __init__(self, capacity, on_evict=None, weigh=None):
+        assert capacity > 0, "capacity of LRU cache must be positive"
+        self.capacity = capacity
+        self.on_evict = on_evict
+        self.weigh = weigh
+
+        self._entries = OrderedDict()
+        self.weight = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        if self.weigh is not None:
+            return "LRU cache of %d entries weighing %d/%d" % (len(self._entries), self.weight, self.capacity)
+        return "LRU cache of %d/%d entries" % (len(self._entries), self.capacity)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def _weight_of(self, value):
+        return self.weigh(value) if self.weigh is not None else 1
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.weight -= self._weight_of(self._entries[key])
+        self._entries[key] = value
+        self.weight += self._weight_of(value)
+
+        # the entry just put is kept even if it alone exceeds the capacity
+        while self.weight > self.capacity and len(self._entries) > 1:
+            lru_key, lru_value = self._entries.popitem(last=False)
+            self.weight -= self._weight_of(lru_value)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(lru_key, lru_value)
+
+    def pop(self, key, default=None):
+        """
+        Remove an entry without calling `on_evict`.
+        """
+        if key not in self._entries:
+            return default
+        value = self._entries.pop(key)
+        self.weight -= self._weight_of(value)
+        return value
+
+    def clear(self):
+        while len(self._entries) > 0:
+            key, value = self._entries.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+        self.weight = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
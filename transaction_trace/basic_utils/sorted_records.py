@@ -0,0 +1,91 @@
+import mmap
+import os
+import struct
+
+SORTED_RECORDS_MAGIC = b"TTSREC01"
+
+# magic, record size, key size, number of records
+_header = struct.Struct(">8sIIQ")
+
+
+def write_sorted_records(filepath, records, key_size, blob=b""):
+    """
+    Write fixed-width records sorted by their first `key_size` bytes, followed by a blob of variable-length data the
+    records may point into, as bytes or an iterable of chunks. Records with the same key keep their order.
+    """
+    records = sorted(records, key=lambda r: r[:key_size])
+    record_size = len(records[0]) if len(records) > 0 else key_size
+    assert all(len(r) == record_size for r in records), "records must have the same width"
+
+    tmp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+    with open(tmp_filepath, "wb") as f:
+        f.write(_header.pack(SORTED_RECORDS_MAGIC, record_size, key_size, len(records)))
+        for r in records:
+            f.write(r)
+        if isinstance(blob, (bytes, bytearray)):
+            f.write(blob)
+        else:
+            for chunk in blob:
+                f.write(chunk)
+    os.replace(tmp_filepath, filepath)
+
+
+class SortedRecordFile:
+    """
+    Memory-mapped file written by `write_sorted_records`, searched by bisection without loading it.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.record_size, self.key_size, self._length = _header.unpack_from(self._mm, 0)
+        if magic != SORTED_RECORDS_MAGIC:
+            raise ValueError("%s is not a sorted record file" % filepath)
+        self._records_offset = _header.size
+        self._blob_offset = self._records_offset + self._length * self.record_size
+
+    def __repr__(self):
+        return "sorted record file %s" % self.filepath
+
+    def __len__(self):
+        return self._length
+
+    def close(self):
+        self._mm.close()
+
+    def key(self, i):
+        offset = self._records_offset + i * self.record_size
+        return self._mm[offset:offset + self.key_size]
+
+    def record(self, i):
+        offset = self._records_offset + i * self.record_size
+        return self._mm[offset:offset + self.record_size]
+
+    def records(self):
+        for i in range(self._length):
+            yield self.record(i)
+
+    def bisect_left(self, key):
+        lo, hi = 0, self._length
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, key):
+        """
+        Records whose key equals `key`.
+        """
+        i = self.bisect_left(key)
+        while i < self._length and self.key(i) == key:
+            yield self.record(i)
+            i += 1
+
+    def blob(self, offset, length):
+        start = self._blob_offset + offset
+        return self._mm[start:start + length]
@@ -1,6 +1,11 @@
 from .ethereum_database import EthereumDatabase
 from .contract_code import ContractCode
+from .bytecode_file import BytecodeFile
+from .local_contract_code import LocalContractCode
 from .contract_transactions import ContractTransactions
 from .contract_token_transactions import ContractTokenTransactions
+from .local_contract_transactions import LocalContractTransactions
 from .database_name import DatabaseName
+from .database_backend import DatabaseBackend
 from .evm_executor import EVMExecutor
+from .columnar_database import ColumnarTraceDatabase
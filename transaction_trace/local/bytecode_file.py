@@ -0,0 +1,71 @@
+import logging
+import os
+import struct
+import tempfile
+
+from ..basic_utils import SortedRecordFile, write_sorted_records
+
+l = logging.getLogger("transaction-trace.local.BytecodeFile")
+
+# address, bytecode hash, offset and length of the bytecode in the blob
+_record = struct.Struct(">20s32sQI")
+
+
+def _read_chunks(f, chunk_size=1 << 24):
+    f.seek(0)
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        yield chunk
+
+
+class BytecodeFile:
+    """
+    Memory-mapped address -> (bytecode hash, bytecode) lookup, written by `write`.
+
+    Bytecodes are stored once per hash as binary, and looked up by bisection over the sorted addresses, so opening
+    the file costs nothing and only the pages of the bytecodes read are loaded.
+    """
+
+    def __init__(self, filepath):
+        self._file = SortedRecordFile(filepath)
+
+    def __repr__(self):
+        return "bytecode file %s" % self._file.filepath
+
+    def __len__(self):
+        return len(self._file)
+
+    def close(self):
+        self._file.close()
+
+    def read(self, address):
+        """
+        (bytecode hash, bytecode) of the contract, or None.
+        """
+        for record in self._file.find(bytes.fromhex(address[2:])):
+            _, bytecode_hash, offset, length = _record.unpack(record)
+            return bytecode_hash.hex(), "0x" + self._file.blob(offset, length).hex()
+        return None
+
+    @staticmethod
+    def write(filepath, rows):
+        """
+        Write (address, bytecode hash, bytecode) rows, e.g. streamed from ContractCode.
+        """
+        records = list()
+        blobs = dict()
+        blob_size = 0
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(filepath))) as blob:
+            for address, bytecode_hash, bytecode in rows:
+                if bytecode is None:
+                    continue
+                if bytecode_hash not in blobs:
+                    data = bytes.fromhex(bytecode[2:] if bytecode.startswith("0x") else bytecode)
+                    blob.write(data)
+                    blobs[bytecode_hash] = (blob_size, len(data))
+                    blob_size += len(data)
+                offset, length = blobs[bytecode_hash]
+                records.append(_record.pack(bytes.fromhex(address[2:]), bytes.fromhex(bytecode_hash), offset, length))
+
+            write_sorted_records(filepath, records, 20, _read_chunks(blob))
+
+        l.info("wrote %d contracts with %d distinct bytecodes to %s", len(records), len(blobs), filepath)
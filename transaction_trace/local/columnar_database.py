@@ -0,0 +1,188 @@
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+l = logging.getLogger("transaction-trace.local.columnar_database")
+
+TRACE_SCHEMA = pa.schema([
+    ('rowid', pa.int64()),
+    ('transaction_hash', pa.string()),
+    ('transaction_index', pa.int64()),
+    ('from_address', pa.string()),
+    ('to_address', pa.string()),
+    ('value', pa.string()),
+    ('input', pa.string()),
+    ('output', pa.string()),
+    ('trace_type', pa.string()),
+    ('call_type', pa.string()),
+    ('reward_type', pa.string()),
+    ('gas', pa.int64()),
+    ('gas_used', pa.int64()),
+    ('subtraces', pa.int64()),
+    ('trace_address', pa.string()),
+    ('error', pa.string()),
+    ('status', pa.int64()),
+    ('block_timestamp', pa.timestamp('us', tz='UTC')),
+    ('block_number', pa.int64()),
+    ('block_hash', pa.string()),
+    # subtraces table folded into the trace rows
+    ('parent_trace_id', pa.int64()),
+    ('subtrace_order', pa.int64()),
+])
+
+TRACE_COLUMNS = [
+    'transaction_hash', 'transaction_index', 'from_address', 'to_address', 'value', 'input', 'output', 'trace_type',
+    'call_type', 'reward_type', 'gas', 'gas_used', 'subtraces', 'trace_address', 'error', 'status', 'block_timestamp',
+    'block_number', 'block_hash'
+]
+
+# the columns SingleTraceDatabase.read_traces(with_rowid=True) returns
+ANALYSIS_TRACE_COLUMNS = [
+    'rowid', 'transaction_hash', 'transaction_index', 'from_address', 'to_address', 'value', 'input', 'trace_type',
+    'call_type', 'gas', 'gas_used', 'trace_address', 'error', 'status', 'block_timestamp', 'block_number', 'block_hash'
+]
+
+# low-cardinality columns which are stored dictionary-encoded
+DICTIONARY_COLUMNS = [
+    'transaction_hash', 'from_address', 'to_address', 'trace_type', 'call_type', 'reward_type', 'error', 'block_hash'
+]
+
+
+def encode_value(value):
+    """
+    DECIMAL values come out of sqlite as int or, beyond 64 bits, as float. Keep them as text so both survive.
+    """
+    return None if value is None else repr(value)
+
+
+def decode_value(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+class ColumnarTraceDatabase:
+    """
+    Read-only, Parquet-backed replacement of SingleTraceDatabase.
+
+    Rows are sorted by block_number, so the row group statistics on block_number allow range scans to skip whole row
+    groups, and only the projected columns are decoded.
+    """
+
+    def __init__(self, db_filepath, date, **kwargs):
+        self._filepath = db_filepath
+        self._date = date
+        self._file = pq.ParquetFile(db_filepath)
+
+    def __repr__(self):
+        return "connection to %s" % self._filepath
+
+    @property
+    def date(self):
+        return self._date
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self._file.close()
+
+    def _row_groups(self, from_block, to_block):
+        block_number_index = self._file.schema_arrow.get_field_index('block_number')
+        for i in range(self._file.num_row_groups):
+            stats = self._file.metadata.row_group(i).column(block_number_index).statistics
+            if stats is not None and stats.has_min_max:
+                if from_block is not None and stats.max < from_block:
+                    continue
+                if to_block is not None and stats.min > to_block:
+                    continue
+            yield i
+
+    def _read_columns(self, columns, from_block=None, to_block=None):
+        filter_block = from_block is not None or to_block is not None
+        read_columns = list(columns)
+        if filter_block and 'block_number' not in read_columns:
+            read_columns.append('block_number')
+
+        for i in self._row_groups(from_block, to_block):
+            for row in self._file.read_row_group(i, columns=read_columns).to_pylist():
+                if filter_block:
+                    if from_block is not None and row['block_number'] < from_block:
+                        continue
+                    if to_block is not None and row['block_number'] > to_block:
+                        continue
+                if 'value' in row:
+                    row['value'] = decode_value(row['value'])
+                yield row
+
+    def read(self, table, columns, conditions="", args=dict()):
+        if table != "traces" or conditions != "":
+            raise NotImplementedError("columnar database only supports plain scans of traces")
+
+        if columns.strip() == "*":
+            columns = TRACE_COLUMNS
+        else:
+            columns = [c.strip() for c in columns.split(",")]
+        return self._read_columns(columns)
+
+    def read_traces(self, with_rowid=False, columns=None, from_block=None, to_block=None):
+        if columns is None:
+            columns = ANALYSIS_TRACE_COLUMNS if with_rowid else TRACE_COLUMNS
+        return self._read_columns(columns, from_block, to_block)
+
+    def read_ordered_traces(self):
+        # rows are written ordered by (block_number, transaction_index, rowid)
+        return self._read_columns(ANALYSIS_TRACE_COLUMNS + ['parent_trace_id', 'subtrace_order'])
+
+    def read_last_trace_id(self):
+        last_trace_id = 0
+        for row in self._read_columns(['rowid']):
+            last_trace_id = max(last_trace_id, row['rowid'])
+        return last_trace_id
+
+    def read_subtraces(self, with_rowid=False):
+        subtraces = [row for row in self._read_columns(['transaction_hash', 'rowid', 'parent_trace_id', 'subtrace_order'])
+                     if row['subtrace_order'] is not None]
+        # keep the insertion order of the subtraces table
+        subtraces.sort(key=lambda row: row['subtrace_order'])
+        for row in subtraces:
+            subtrace = {
+                'transaction_hash': row['transaction_hash'],
+                'trace_id': row['rowid'],
+                'parent_trace_id': row['parent_trace_id'],
+            }
+            if with_rowid:
+                subtrace['rowid'] = row['subtrace_order']
+            yield subtrace
+
+    @staticmethod
+    def convert(trace_db, db_filepath, row_group_size=100000):
+        """
+        Write the traces and subtraces of a SingleTraceDatabase into a Parquet file.
+        """
+        l.info("convert %s to %s", trace_db, db_filepath)
+        rows = trace_db.read(
+            "traces LEFT JOIN subtraces ON subtraces.trace_id = traces.rowid",
+            "traces.rowid, %s, subtraces.parent_trace_id, subtraces.rowid" % ", ".join(
+                "traces.%s" % c for c in TRACE_COLUMNS),
+            "ORDER BY traces.block_number, traces.transaction_index, traces.rowid"
+        )
+
+        value_index = TRACE_SCHEMA.get_field_index('value')
+        with pq.ParquetWriter(db_filepath, TRACE_SCHEMA, use_dictionary=DICTIONARY_COLUMNS,
+                              write_statistics=True) as writer:
+            while True:
+                batch = rows.fetchmany(row_group_size)
+                if len(batch) == 0:
+                    break
+                columns = [list(c) for c in zip(*batch)]
+                columns[value_index] = [encode_value(v) for v in columns[value_index]]
+                writer.write_table(pa.Table.from_arrays(columns, schema=TRACE_SCHEMA), row_group_size=row_group_size)
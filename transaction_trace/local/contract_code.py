@@ -1,3 +1,5 @@
+import MySQLdb.cursors
+
 from .database import Database
 
 
@@ -57,6 +59,33 @@ class ContractCode(Database):
     def read_bytecode(self, contract):
         return self.read("byte_code", "bytecode", "WHERE address = %s", (contract,))
 
+    def read_bytecode_hashes(self, contracts):
+        """
+        (address, bytecode_hash) of the contracts.
+        """
+        if len(contracts) == 0:
+            return []
+        placeholders = ", ".join(["%s"] * len(contracts))
+        return self.read("byte_code", "address, bytecode_hash", f"WHERE address IN ({placeholders})", tuple(contracts))
+
+    def read_bytecodes_by_hash(self, bytecode_hashes):
+        """
+        (bytecode_hash, bytecode) of the hashes.
+        """
+        if len(bytecode_hashes) == 0:
+            return []
+        placeholders = ", ".join(["%s"] * len(bytecode_hashes))
+        return self.read("byte_code", "distinct(bytecode_hash), bytecode", f"WHERE bytecode_hash IN ({placeholders})",
+                         tuple(bytecode_hashes))
+
+    def stream_bytecodes(self):
+        """
+        (address, bytecode_hash, bytecode) of all contracts, fetched from the server as they are consumed.
+        """
+        cur = self._conn.cursor(MySQLdb.cursors.SSCursor)
+        cur.execute("SELECT address, bytecode_hash, bytecode FROM byte_code")
+        return cur
+
     def search_keyword_in_source(self, keyword, columns="address"):
         return self.read(
             "byte_code INNER JOIN source_code ON byte_code.bytecode_hash = source_code.bytecode_hash",
@@ -32,14 +32,22 @@ class ContractTransactions(Database):
             ALTER TABLE contract_transactions ADD INDEX contract_index (contract(42))
         """)
 
-    def insert_transactions_of_contract(self, tx_hash, date, contracts, sensitive):
+    def insert_transactions_of_contract(self, tx_hash, date, contracts, sensitive, block_number=None, tx_index=None):
+        # the position of the transaction in the chain is not stored
         rows = [(contract, date, tx_hash, sensitive) for contract in contracts]
         self.batch_insert("contract_transactions",
                           "(contract, transaction_date, transaction_hash, sensitive_result)", "%s, %s, %s, %s", rows)
 
-    def read_transactions_of_contract(self, contract):
-        rows = self.read("contract_transactions", "transaction_date, transaction_hash",
-                         "WHERE contract=%s", (contract,))
+    def read_transactions_of_contract(self, contract, from_date=None, to_date=None):
+        conditions = "WHERE contract=%s"
+        args = [contract]
+        if from_date is not None:
+            conditions += " AND transaction_date >= %s"
+            args.append(from_date[:10] if isinstance(from_date, str) else from_date)
+        if to_date is not None:
+            conditions += " AND transaction_date <= %s"
+            args.append(to_date[:10] if isinstance(to_date, str) else to_date)
+        rows = self.read("contract_transactions", "transaction_date, transaction_hash", conditions, tuple(args))
         txs = defaultdict(list)
         for row in rows:
             txs[DatetimeUtils.date_to_str(row[0])].append(row[1])
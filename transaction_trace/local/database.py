@@ -1,16 +1,43 @@
+import os
 import sqlite3
+from urllib.request import pathname2url
+
 import MySQLdb
 
 
+# pragmas of connections to immutable day files, tuned for large scans
+READ_ONLY_PRAGMAS = [
+    "PRAGMA query_only = ON;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA mmap_size = %d;" % (1 << 32),
+    "PRAGMA cache_size = -%d;" % (1 << 18),
+]
+
+
 class Database:
-    def __init__(self, db_filepath, date, inner_db="sqlite3", **args):
+    def __init__(self, db_filepath, date, inner_db="sqlite3", read_only=False, raw_types=False, **args):
+        """
+        With `read_only`, the sqlite file is opened as immutable, which is only safe for files that are no longer
+        written, and the connection can be shared between threads. Otherwise the connection belongs to the thread
+        which uses it, but it can be closed by any thread.
+
+        With `raw_types`, declared column types are not converted, e.g. TIMESTAMP columns are read as text.
+        """
         self._filepath = db_filepath
         self._date = date
         self.inner_db = inner_db
+        self.read_only = read_only
 
         if inner_db == "sqlite3":
-            conn = sqlite3.connect(
-                db_filepath, detect_types=sqlite3.PARSE_DECLTYPES)
+            detect_types = 0 if raw_types else sqlite3.PARSE_DECLTYPES
+            if read_only:
+                conn = sqlite3.connect("file:%s?mode=ro&immutable=1" % pathname2url(os.path.abspath(db_filepath)),
+                                       detect_types=detect_types, uri=True, check_same_thread=False)
+                for pragma in READ_ONLY_PRAGMAS:
+                    conn.execute(pragma)
+            else:
+                conn = sqlite3.connect(
+                    db_filepath, detect_types=detect_types, check_same_thread=False)
             conn.row_factory = sqlite3.Row
         elif inner_db == "mysql":
             conn = MySQLdb.connect(**args)
@@ -24,9 +51,33 @@ class Database:
     def date(self):
         return self._date
 
+    @property
+    def filepath(self):
+        return self._filepath
+
     def commit(self):
         self._conn.commit()
 
+    def close(self):
+        self._conn.close()
+
+    def begin_bulk_load(self, cache_size=65536, journal_mode="MEMORY"):
+        """
+        Trade durability for speed while writing many rows, `cache_size` in KiB. Must be called outside a transaction.
+
+        With WAL journal_mode, a crash still leaves the last committed state intact.
+        """
+        cur = self._conn.cursor()
+        cur.execute(f"PRAGMA journal_mode = {journal_mode};")
+        cur.execute("PRAGMA synchronous = OFF;")
+        cur.execute(f"PRAGMA cache_size = -{cache_size};")
+
+    def end_bulk_load(self):
+        self.commit()
+        cur = self._conn.cursor()
+        cur.execute("PRAGMA synchronous = FULL;")
+        cur.execute("PRAGMA journal_mode = DELETE;")
+
     def create_table(self, table_name, columns):
         cur = self._conn.cursor()
         cur.execute(f"CREATE TABLE IF NOT EXISTS {table_name}({columns});")
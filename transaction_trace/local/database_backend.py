@@ -0,0 +1,5 @@
+class DatabaseBackend:
+
+    # the value is also the extension of the per-day database files
+    SQLITE = 'sqlite3'
+    PARQUET = 'parquet'
@@ -2,18 +2,21 @@ import datetime
 import logging
 import os
 import re
+import threading
 
 from sortedcontainers import SortedList
 
-from ..basic_utils import DatetimeUtils
+from ..basic_utils import DatetimeUtils, LRUCache
+from .columnar_database import ColumnarTraceDatabase
+from .database_backend import DatabaseBackend
 from .database_name import DatabaseName
 from .single_database import SingleDatabaseFactory, SingleTraceDatabase
 
 l = logging.getLogger("transaction-trace.local.ethereum_database")
 
 
-def data_time_range(db_folder, db_name):
-    prog = re.compile(r"%s_(\d{4}\-\d{2}\-\d{2})\.sqlite3" % db_name)
+def data_time_range(db_folder, db_name, backend=DatabaseBackend.SQLITE):
+    prog = re.compile(r"%s_(\d{4}\-\d{2}\-\d{2})\.%s$" % (db_name, backend))
     dates = SortedList(key=lambda x: DatetimeUtils.str_to_date(x))
     for file in os.listdir(db_folder):
         m = prog.match(file)
@@ -23,21 +26,41 @@ def data_time_range(db_folder, db_name):
     return dates
 
 
-def db_filename(db_name, date):
-    return "%s_%s.sqlite3" % (db_name, date)
+def db_filename(db_name, date, backend=DatabaseBackend.SQLITE):
+    return "%s_%s.%s" % (db_name, date, backend)
+
+
+def get_single_database(db_name, backend=DatabaseBackend.SQLITE):
+    if backend == DatabaseBackend.PARQUET:
+        if db_name != DatabaseName.TRACE_DATABASE:
+            raise NotImplementedError("columnar backend is only available for %s" % DatabaseName.TRACE_DATABASE)
+        return ColumnarTraceDatabase
+
+    return SingleDatabaseFactory.get_single_database(db_name)
 
 
 class EthereumDatabase:
 
-    def __init__(self, db_folder, db_name=DatabaseName.TRACE_DATABASE, cache_capacity=20):
+    def __init__(self, db_folder, db_name=DatabaseName.TRACE_DATABASE, cache_capacity=20, backend=DatabaseBackend.SQLITE,
+                 read_only=False, raw_types=False):
+        """
+        Connections are kept in an LRU cache of `cache_capacity` entries and closed on eviction, so a connection must
+        not be used after `cache_capacity` other days have been opened.
+
+        Connections are per thread by default. With `read_only`, the day files are opened as immutable and one
+        connection per day is shared by all threads. With `raw_types`, sqlite columns are not converted to Python
+        types by their declared type.
+        """
         self._db_folder = db_folder
         self._db_name = db_name
+        self._backend = backend
+        self._read_only = read_only
+        self._raw_types = raw_types
 
-        self._data_time_range = data_time_range(db_folder, self._db_name)
+        self._data_time_range = data_time_range(db_folder, self._db_name, self._backend)
 
-        self._cache_capacity = cache_capacity
-        self._connection_cache = dict()
-        self._connection_access = list()
+        self._connection_cache = LRUCache(cache_capacity, on_evict=self._close_connection)
+        self._lock = threading.RLock()
 
     def __repr__(self):
         return "database manager of %s" % self._db_folder
@@ -46,6 +69,15 @@ class EthereumDatabase:
     def time_range(self):
         return self._data_time_range
 
+    @property
+    def cache_stats(self):
+        return self._connection_cache.stats()
+
+    @staticmethod
+    def _close_connection(key, db):
+        l.debug("close %s", db)
+        db.close()
+
     def get_connection(self, date):
         if isinstance(date, datetime.datetime):
             date = DatetimeUtils.date_to_str(date)
@@ -53,35 +85,39 @@ class EthereumDatabase:
         if date not in self._data_time_range:
             return None
 
-        if date in self._connection_cache:
-            self._connection_access.remove(date)
-            self._connection_access.append(date)
-            return self._connection_cache[date]
-
-        if len(self._connection_cache) == self._cache_capacity:
-            lru = self._connection_access.pop(0)
-            conn = self._connection_cache.pop(lru)
-            del conn
-
-        db_filepath = os.path.join(
-            self._db_folder, db_filename(self._db_name, date))
-        db = SingleDatabaseFactory.get_single_database(self._db_name)(db_filepath, date)
-        self._connection_access.append(date)
-        self._connection_cache[date] = db
-        return db
+        key = date if self._read_only else (threading.get_ident(), date)
+        with self._lock:
+            db = self._connection_cache.get(key)
+            if db is None:
+                db_filepath = os.path.join(
+                    self._db_folder, db_filename(self._db_name, date, self._backend))
+                db = get_single_database(self._db_name, self._backend)(db_filepath, date, read_only=self._read_only,
+                                                                  raw_types=self._raw_types)
+                self._connection_cache.put(key, db)
+            return db
+
+    def close(self):
+        with self._lock:
+            self._connection_cache.clear()
 
     def get_connections(self, from_time, to_time):
         '''
         Time range can be datetime.datetime or string.
         '''
+        for date in self.get_dates(from_time, to_time):
+            yield self.get_connection(date)
+
+    def get_dates(self, from_time, to_time):
+        '''
+        Dates with data in the time range, which can be datetime.datetime or string.
+        '''
         if isinstance(from_time, datetime.datetime):
             from_time = DatetimeUtils.date_to_str(from_time)
         if isinstance(to_time, datetime.datetime):
             to_time = DatetimeUtils.date_to_str(to_time)
 
-        for i in range(self._data_time_range.bisect_left(from_time), self._data_time_range.bisect_right(to_time)):
-            date = self._data_time_range[i]
-            yield self.get_connection(date)
+        return [self._data_time_range[i] for i in range(self._data_time_range.bisect_left(from_time),
+                                                        self._data_time_range.bisect_right(to_time))]
 
     def get_all_connnections(self):
         for date in self._data_time_range:
@@ -1,65 +1,176 @@
+import hashlib
+import json
+import logging
 import os
 import re
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from ..basic_utils import LRUCache
+
+l = logging.getLogger("transaction-trace.local.EVMExecutor")
 
 access_re = re.compile("storage ([^:]*):\[([^:]*): ([^\]]*)\]")
 
 
+def parse_storage_accesses(output):
+    access_log = list()
+    for op, loc, val in access_re.findall(output):
+        access_log.append((op, int(loc, 16)))
+    return access_log
+
+
+def content_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ContentCache:
+    """
+    On-disk cache of JSON values by content key, `{cache_folder}/{kind}/{key[:2]}/{key}.json`.
+
+    Entries are written to a temporary file and renamed, so runs and processes sharing the folder never read a
+    partial entry and racing writers of the same entry write the same content.
+    """
+
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+
+    def __repr__(self):
+        return "evm cache in %s" % self.cache_folder
+
+    def filepath(self, kind, key):
+        return os.path.join(self.cache_folder, kind, key[:2], key + ".json")
+
+    def get(self, kind, key):
+        try:
+            with open(self.filepath(kind, key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, kind, key, value):
+        filepath = self.filepath(kind, key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_filepath = "%s.%d.%d.tmp" % (filepath, os.getpid(), id(value))
+        with open(tmp_filepath, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_filepath, filepath)
+
+
 class EVMExecutor:
+    """
+    Run code with the bundled `evm` binary.
 
-    def __init__(self, cache_len=100000):
+    The binary runs one piece of code per process, so batches are run by a pool of `workers` threads each waiting on
+    its own evm process. Code is passed through stdin rather than argv, which is limited in size.
+
+    Results are kept in LRU caches keyed by a hash of (code, input), and with `cache_folder` also on disk, so they are
+    shared by runs and processes.
+    """
+
+    def __init__(self, cache_len=100000, workers=None, deployed_cache_len=10000, cache_folder=None):
         self.evm = "evm_{}".format(sys.platform)
 
         current_dir = os.path.dirname(os.path.realpath(__file__))
         self.evm_filepath = os.path.join(current_dir + "/../res/bin", self.evm)
 
-        self._deployed_code_cache = dict()
-
-        self._storage_access_cache = dict()
-        self._access_history = list()
-        self._cache_len = cache_len
+        self._deployed_code_cache = LRUCache(deployed_cache_len)
+        self._storage_access_cache = LRUCache(cache_len)
+        self._disk_cache = ContentCache(cache_folder) if cache_folder is not None else None
+
+        self.workers = workers if workers is not None else os.cpu_count()
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, func, jobs):
+        if len(jobs) <= 1 or self.workers <= 1:
+            return [func(*job) for job in jobs]
+
+        # created on first use, so that importing a checker does not start threads
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers)
+        return list(self._pool.map(func, *zip(*jobs)))
+
+    def _run(self, code, *args):
+        result = subprocess.run([self.evm_filepath, "--codefile", "-", *args, "run"],
+                                input=code.encode("utf-8"), stdout=subprocess.PIPE)
+        return result.stdout.decode("utf-8")
+
+    def _create(self, creation_code):
+        return self._run(creation_code, "--create").split("\n")[-2]
+
+    def _trace_storage_accesses(self, code, i):
+        return parse_storage_accesses(self._run(code, "--input", i))
+
+    def _cached(self, cache, kind, key):
+        value = cache.get(key)
+        if value is None and self._disk_cache is not None:
+            value = self._disk_cache.get(kind, key)
+            if value is not None:
+                cache.put(key, value)
+        return value
+
+    def _cache(self, cache, kind, key, value):
+        cache.put(key, value)
+        if self._disk_cache is not None:
+            self._disk_cache.put(kind, key, value)
+
+    def _batch(self, cache, kind, func, jobs):
+        """
+        Results of func on every job, running the ones neither in the cache nor on disk as a batch.
+        """
+        results = [None] * len(jobs)
+        missing = dict()
+        for n, job in enumerate(jobs):
+            key = content_key(*job)
+            value = self._cached(cache, kind, key)
+            if value is not None:
+                results[n] = value
+            else:
+                missing.setdefault(key, (job, list()))[1].append(n)
+
+        if len(missing) > 0:
+            l.debug("run %d evm %s jobs", len(missing), kind)
+        keys = list(missing)
+        for key, value in zip(keys, self._map(func, [missing[key][0] for key in keys])):
+            self._cache(cache, kind, key, value)
+            for n in missing[key][1]:
+                results[n] = value
+
+        return results
 
     def deployed_code(self, creation_code):
-        creation_code = creation_code.replace("0x", "")
-
-        if creation_code in self._deployed_code_cache:
-            return self._deployed_code_cache[creation_code]
+        return self.deployed_codes([creation_code])[0]
 
-        result = subprocess.run([self.evm_filepath,
-                                 "--create",
-                                 "--code", creation_code,
-                                 "run"], stdout=subprocess.PIPE)
-        code = result.stdout.decode("utf-8").split("\n")[-2]
-        self._deployed_code_cache[creation_code] = code
-        return code
+    def deployed_codes(self, creation_codes):
+        """
+        Deployed code of every creation code, running the missing ones as a batch.
+        """
+        jobs = [(creation_code.replace("0x", ""),) for creation_code in creation_codes]
+        return self._batch(self._deployed_code_cache, "deployed_code", self._create, jobs)
 
     def log_storage_accesses(self, deployed_code, input_data):
-        if deployed_code is None:
-            return set()
-
-        code = deployed_code.replace("0x", "")
-        i = input_data.replace("0x", "")
-
-        if (code, i) in self._access_history:
-            self._access_history.remove((code, i))
-            self._access_history.append((code, i))
-            return self._storage_access_cache[(code, i)]
-        if len(self._access_history) == self._cache_len:
-            lru = self._access_history.pop(0)
-            self._storage_access_cache.pop(lru)
-
-        result = subprocess.run([self.evm_filepath,
-                                 "--code", code,
-                                 "--input", i,
-                                 "run"], stdout=subprocess.PIPE)
-        output = result.stdout.decode("utf-8")
-
-        access_log = list()
-        for op, loc, val in access_re.findall(output):
-            access_log.append((op, int(loc, 16)))
-
-        self._access_history.append((code, i))
-        self._storage_access_cache[(code, i)] = access_log
-
-        return access_log
+        return self.log_storage_accesses_batch([(deployed_code, input_data)])[0]
+
+    def log_storage_accesses_batch(self, jobs):
+        """
+        Storage accesses of every (deployed code, input data), running the uncached ones as a batch.
+        """
+        runs = [n for n, (deployed_code, _) in enumerate(jobs) if deployed_code is not None]
+        access_logs = self._batch(self._storage_access_cache, "storage_accesses", self._trace_storage_accesses,
+                                  [(jobs[n][0].replace("0x", ""), jobs[n][1].replace("0x", "")) for n in runs])
+
+        results = [set() for _ in jobs]
+        for n, access_log in zip(runs, access_logs):
+            # json has no tuples
+            results[n] = [tuple(access) for access in access_log]
+        return results
@@ -0,0 +1,156 @@
+import logging
+import os
+
+import zstandard
+
+from .database import Database
+
+l = logging.getLogger("transaction-trace.local.LocalContractCode")
+
+BYTE_CODE_COLUMNS = ("address", "bytecode", "bytecode_hash", "function_sighashes", "is_erc20", "is_erc721",
+                     "block_timestamp", "block_number", "block_hash")
+SOURCE_CODE_COLUMNS = ("bytecode_hash", "source_code", "abi", "contract_name", "compiler_version",
+                       "optimization_used", "runs", "constructor_arguments", "library", "swarm_source")
+
+# trigram index only matches keywords of 3 characters or more
+MIN_INDEXED_KEYWORD = 3
+
+
+def compress(text):
+    return zstandard.ZstdCompressor(level=9).compress(text.encode("utf-8"))
+
+
+def decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+
+
+def _source_contains(data, keyword):
+    return data is not None and keyword.lower() in decompress(data).lower()
+
+
+class LocalContractCode(Database):
+    """
+    Embedded replacement of ContractCode in a single sqlite file, with the same methods.
+
+    Bytecodes and source codes are stored once per bytecode_hash as zstd-compressed blobs, `byte_code` maps addresses
+    to their hash, and source codes are indexed by a contentless FTS5 trigram index, so keyword searches are substring
+    matches served by the index instead of scans. In read_only mode the file can be opened by many processes.
+    """
+
+    def __init__(self, db_folder, read_only=False):
+        super(LocalContractCode, self).__init__(os.path.join(db_folder, "contract_code.sqlite3"), "",
+                                                read_only=read_only)
+        self._conn.create_function("source_contains", 2, _source_contains, deterministic=True)
+
+    def __repr__(self):
+        return "local contract code in %s" % self.filepath
+
+    def create_tables(self):
+        cur = self._conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS byte_code(
+                address TEXT PRIMARY KEY,
+                bytecode_hash TEXT,
+                function_sighashes TEXT,
+                is_erc20 BOOLEAN,
+                is_erc721 BOOLEAN,
+                block_timestamp TIMESTAMP NOT NULL,
+                block_number INT NOT NULL,
+                block_hash TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bytecode_blob(
+                bytecode_hash TEXT PRIMARY KEY,
+                bytecode BLOB
+            ) WITHOUT ROWID;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS source_code(
+                bytecode_hash TEXT UNIQUE,
+                source_code BLOB,
+                abi TEXT,
+                contract_name TEXT,
+                compiler_version TEXT,
+                optimization_used TEXT,
+                runs TEXT,
+                constructor_arguments TEXT,
+                library TEXT,
+                swarm_source TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS source_index USING fts5(source_code, content='', tokenize='trigram');
+        """)
+
+    def insert_byte_code(self, row):
+        row = dict(zip(BYTE_CODE_COLUMNS, row))
+        cur = self._conn.cursor()
+        if row["bytecode"] is not None:
+            cur.execute("INSERT OR IGNORE INTO bytecode_blob VALUES (?, ?)",
+                        (row["bytecode_hash"], compress(row["bytecode"])))
+        cur.execute("INSERT OR REPLACE INTO byte_code VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    tuple(row[k] for k in BYTE_CODE_COLUMNS if k != "bytecode"))
+
+    def insert_source_code(self, row):
+        row = dict(zip(SOURCE_CODE_COLUMNS, row))
+        source_code = row["source_code"]
+        row["source_code"] = compress(source_code) if source_code is not None else None
+
+        cur = self._conn.cursor()
+        cur.execute("INSERT OR IGNORE INTO source_code VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    tuple(row[k] for k in SOURCE_CODE_COLUMNS))
+        if cur.rowcount == 1 and source_code is not None:
+            cur.execute("INSERT INTO source_index(rowid, source_code) VALUES (?, ?)", (cur.lastrowid, source_code))
+
+    def create_bytecode_index(self):
+        cur = self._conn.cursor()
+        cur.execute("CREATE INDEX IF NOT EXISTS bytecode_hash_index ON byte_code(bytecode_hash);")
+
+    def create_source_code_index(self):
+        # the trigram index is maintained on insert, merge its segments after bulk loads
+        cur = self._conn.cursor()
+        cur.execute("INSERT INTO source_index(source_index) VALUES ('optimize');")
+
+    def read_bytecode(self, contract):
+        rows = self.read("byte_code INNER JOIN bytecode_blob ON byte_code.bytecode_hash = bytecode_blob.bytecode_hash",
+                         "bytecode_blob.bytecode", "WHERE address = ?", (contract,))
+        return [(decompress(row[0]),) for row in rows]
+
+    def read_bytecode_hashes(self, contracts):
+        placeholders = ", ".join(["?"] * len(contracts))
+        return [tuple(row) for row in
+                self.read("byte_code", "address, bytecode_hash", f"WHERE address IN ({placeholders})",
+                          tuple(contracts))]
+
+    def read_bytecodes_by_hash(self, bytecode_hashes):
+        placeholders = ", ".join(["?"] * len(bytecode_hashes))
+        rows = self.read("bytecode_blob", "bytecode_hash, bytecode", f"WHERE bytecode_hash IN ({placeholders})",
+                         tuple(bytecode_hashes))
+        return [(row[0], decompress(row[1])) for row in rows]
+
+    def stream_bytecodes(self):
+        rows = self.read("byte_code INNER JOIN bytecode_blob ON byte_code.bytecode_hash = bytecode_blob.bytecode_hash",
+                         "byte_code.address, byte_code.bytecode_hash, bytecode_blob.bytecode")
+        for row in rows:
+            yield row[0], row[1], decompress(row[2])
+
+    def read_source_code(self, bytecode_hash):
+        rows = self.read("source_code", "source_code", "WHERE bytecode_hash = ?", (bytecode_hash,)).fetchall()
+        if len(rows) == 0 or rows[0][0] is None:
+            return None
+        return decompress(rows[0][0])
+
+    def search_keyword_in_source(self, keyword, columns="address"):
+        """
+        Case-insensitive substring search, as `LIKE "%keyword%"` in MySQL.
+        """
+        table = "byte_code INNER JOIN source_code ON byte_code.bytecode_hash = source_code.bytecode_hash"
+        if len(keyword) < MIN_INDEXED_KEYWORD:
+            l.debug("scan source code for short keyword %s", keyword)
+            return self.read(table, columns, "WHERE source_contains(source_code.source_code, ?)", (keyword,))
+
+        phrase = '"%s"' % keyword.replace('"', '""')
+        return self.read(table, columns,
+                         "WHERE source_code.rowid IN (SELECT rowid FROM source_index WHERE source_index MATCH ?)",
+                         (phrase,))
@@ -0,0 +1,149 @@
+import heapq
+import logging
+import os
+import struct
+from collections import defaultdict
+from datetime import date as date_type
+
+from ..basic_utils import DatetimeUtils, SortedRecordFile, write_sorted_records
+from .database import Database
+
+l = logging.getLogger("transaction-trace.local.LocalContractTransactions")
+
+
+def address_to_bytes(address):
+    return bytes.fromhex(address[2:])
+
+
+def hash_to_hex(h):
+    return "0x" + h.hex()
+
+
+def date_to_ordinal(d):
+    if isinstance(d, str):
+        return DatetimeUtils.str_to_date(d[:10]).toordinal()
+    return d.toordinal()
+
+
+def ordinal_to_str(ordinal):
+    return DatetimeUtils.date_to_str(date_type.fromordinal(ordinal))
+
+
+# contract, date ordinal, block_number, transaction_index, transaction_hash, sensitive_result, in table column order.
+# big-endian, so the bytes of a record sort like its primary key
+_posting = struct.Struct(">20sIQI32s?")
+POSTING_KEY_SIZE = 36
+
+
+class LocalContractTransactions(Database):
+    """
+    Embedded replacement of ContractTransactions in a single sqlite file, with the same methods to write and read it.
+
+    Rows are clustered by (contract, date, block_number, transaction_index) in a WITHOUT ROWID table with binary
+    addresses and hashes, so the transactions of a contract are one sorted posting list read by a single range scan,
+    which can be further restricted to a range of dates. The primary key is the index by contract, there is no
+    `create_contract_index`.
+    """
+
+    def __init__(self, index_folder, read_only=False):
+        super(LocalContractTransactions, self).__init__(os.path.join(index_folder, "contract_transactions.sqlite3"), "",
+                                                        read_only=read_only)
+
+    def __repr__(self):
+        return "local contract-centric transaction index in %s" % self.filepath
+
+    def create_contract_transactions_table(self):
+        cur = self._conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS contract_transactions(
+                contract BLOB NOT NULL,
+                transaction_date INT NOT NULL,
+                block_number INT NOT NULL,
+                transaction_index INT NOT NULL,
+                transaction_hash BLOB NOT NULL,
+                sensitive_result BOOLEAN,
+                PRIMARY KEY (contract, transaction_date, block_number, transaction_index)
+            ) WITHOUT ROWID;
+        """)
+
+    def create_index_progress_table(self):
+        cur = self._conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS index_progress(
+                indexed_date TEXT PRIMARY KEY,
+                last_trace_id INT
+            ) WITHOUT ROWID;
+        """)
+
+    def read_index_progress(self):
+        """
+        Date -> rowid of the last trace of the day when it was indexed, for the days merged into the index.
+        """
+        return {row[0]: row[1] for row in self.read("index_progress", "indexed_date, last_trace_id")}
+
+    def update_index_progress(self, progress):
+        """
+        Record (date, last trace id) of indexed days. Manual database commit is needed.
+        """
+        cur = self._conn.cursor()
+        cur.executemany("INSERT OR REPLACE INTO index_progress VALUES (?, ?)", progress)
+
+    @staticmethod
+    def posting_records(tx_hash, date, contracts, sensitive, block_number, tx_index):
+        """
+        Encode the arguments of `insert_transactions_of_contract` as records of a posting run.
+        """
+        tx_hash = bytes.fromhex(tx_hash[2:])
+        date = date_to_ordinal(date)
+        return [_posting.pack(address_to_bytes(contract), date, block_number, tx_index, tx_hash, sensitive)
+                for contract in contracts if contract is not None]
+
+    @staticmethod
+    def write_posting_run(filepath, records):
+        """
+        Write records of `posting_records` sorted in index order.
+        """
+        write_sorted_records(filepath, records, POSTING_KEY_SIZE)
+
+    def _insert_records(self, records):
+        cur = self._conn.cursor()
+        # rebuilding a day replaces its rows
+        cur.executemany("INSERT OR REPLACE INTO contract_transactions VALUES (?, ?, ?, ?, ?, ?)",
+                        (_posting.unpack(r) for r in records))
+
+    def insert_transactions_of_contract(self, tx_hash, date, contracts, sensitive, block_number, tx_index):
+        self._insert_records(self.posting_records(tx_hash, date, contracts, sensitive, block_number, tx_index))
+
+    def merge_posting_runs(self, runs):
+        """
+        Merge (date, run filepath) written by `write_posting_run` into the index with a k-way merge, so rows are
+        inserted in index order. Manual database commit is needed, commit them together with the progress of the
+        dates.
+        """
+        run_files = [SortedRecordFile(filepath) for _, filepath in runs]
+        try:
+            self._insert_records(heapq.merge(*[f.records() for f in run_files]))
+        finally:
+            for f in run_files:
+                f.close()
+
+    def read_transactions_of_contract(self, contract, from_date=None, to_date=None):
+        """
+        Transaction hashes of the contract by date in execution order, optionally only from `from_date` to `to_date`
+        (inclusive, dates or strings starting with YYYY-MM-DD).
+        """
+        conditions = "WHERE contract = ?"
+        args = [address_to_bytes(contract)]
+        if from_date is not None:
+            conditions += " AND transaction_date >= ?"
+            args.append(date_to_ordinal(from_date))
+        if to_date is not None:
+            conditions += " AND transaction_date <= ?"
+            args.append(date_to_ordinal(to_date))
+
+        rows = self.read("contract_transactions", "transaction_date, transaction_hash",
+                         conditions + " ORDER BY transaction_date, block_number, transaction_index", tuple(args))
+        txs = defaultdict(list)
+        for row in rows:
+            txs[ordinal_to_str(row[0])].append(hash_to_hex(row[1]))
+        return txs
@@ -63,8 +63,8 @@ class SingleDatabaseFactory():
 
 class SingleTraceDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleTraceDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleTraceDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_traces_table(self):
         cur = self._conn.cursor()
@@ -102,6 +102,44 @@ class SingleTraceDatabase(Database):
             );
         """)
 
+    def create_subtrace_progress_table(self):
+        cur = self._conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS subtrace_progress(
+                last_trace_id INT
+            );
+        """)
+
+    def read_subtrace_progress(self):
+        """
+        The rowid of the last trace whose subtrace has been built, or None.
+        """
+        row = self.read("subtrace_progress", "last_trace_id").fetchone()
+        return None if row is None else row['last_trace_id']
+
+    def update_subtrace_progress(self, last_trace_id):
+        """
+        Manual database commit is needed.
+        """
+        self.delete("subtrace_progress")
+        self.insert("subtrace_progress", "", "?", (last_trace_id,))
+
+    def create_traces_index(self):
+        """
+        Index traces in chain order. The rowid is implicitly part of the index, so ordering by
+        (block_number, transaction_index, rowid) is served by the index without sorting.
+        """
+        cur = self._conn.cursor()
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS traces_order_index ON traces(
+                block_number, transaction_index
+            );
+        """)
+
+    def drop_traces_index(self):
+        cur = self._conn.cursor()
+        cur.execute("DROP INDEX IF EXISTS traces_order_index;")
+
     def insert_trace(self, row):
         """
         Manual database commit is needed.
@@ -152,6 +190,17 @@ class SingleTraceDatabase(Database):
         columns = "rowid, transaction_hash, transaction_index, from_address, to_address, value, input, trace_type, call_type, gas, gas_used, trace_address, error, status, block_timestamp, block_number, block_hash" if with_rowid else "*"
         return self.read("traces", columns)
 
+    def read_ordered_traces(self):
+        """
+        Traces ordered by (block_number, transaction_index, rowid), each with its parent trace id and the order of its
+        row in the subtraces table.
+        """
+        return self.read(
+            "traces LEFT JOIN subtraces ON subtraces.trace_id = traces.rowid",
+            "traces.rowid AS rowid, traces.transaction_hash, traces.transaction_index, traces.from_address, traces.to_address, traces.value, traces.input, traces.trace_type, traces.call_type, traces.gas, traces.gas_used, traces.trace_address, traces.error, traces.status, traces.block_timestamp, traces.block_number, traces.block_hash, subtraces.parent_trace_id AS parent_trace_id, subtraces.rowid AS subtrace_order",
+            "ORDER BY traces.block_number, traces.transaction_index, traces.rowid"
+        )
+
     def insert_subtrace(self, row):
         """
         Manual database commit is needed.
@@ -163,18 +212,43 @@ class SingleTraceDatabase(Database):
             row
         )
 
+    def insert_subtraces(self, rows):
+        """
+        Manual database commit is needed.
+        """
+        self.batch_insert(
+            "subtraces",
+            "",
+            "?, ?, ?",
+            rows
+        )
+
+    def read_trace_addresses(self, after_trace_id=0):
+        """
+        Only the columns needed to link traces to their parents, of the traces after `after_trace_id` in rowid order.
+        """
+        return self.read("traces", "rowid, transaction_hash, trace_address", "WHERE rowid > :rowid ORDER BY rowid",
+                         {"rowid": after_trace_id})
+
     def read_subtraces(self, with_rowid=False):
         columns = "rowid, *" if with_rowid else "*"
         return self.read("subtraces", columns)
 
+    def read_last_trace_id(self):
+        """
+        The rowid of the last trace, 0 if there is none. Traces are appended, so it only grows with the day.
+        """
+        row = self.read("traces", "max(rowid)").fetchone()
+        return 0 if row[0] is None else row[0]
+
     def clear_subtraces(self):
         self.delete("subtraces")
 
 
 class SingleBlockDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleBlockDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleBlockDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_blocks_table(self):
         self.create_table(
@@ -217,8 +291,8 @@ class SingleBlockDatabase(Database):
 
 class SingleTransactionDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleTransactionDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleTransactionDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_txs_table(self):
         self.create_table(
@@ -260,8 +334,8 @@ class SingleTransactionDatabase(Database):
 
 class SingleTokenTransferDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleTokenTransferDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleTokenTransferDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_token_transfers_table(self):
         self.create_table(
@@ -298,8 +372,8 @@ class SingleTokenTransferDatabase(Database):
 
 class SingleContractDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleContractDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleContractDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_contracts_table(self):
         self.create_table(
@@ -341,8 +415,8 @@ class SingleContractDatabase(Database):
 
 class SingleLogDatabase(Database):
 
-    def __init__(self, db_filepath, date):
-        super(SingleLogDatabase, self).__init__(db_filepath, date)
+    def __init__(self, db_filepath, date, **kwargs):
+        super(SingleLogDatabase, self).__init__(db_filepath, date, **kwargs)
 
     def create_logs_table(self):
         self.create_table(
@@ -374,5 +448,5 @@ class SingleLogDatabase(Database):
             table="logs",
             columns="",
             placeholders="?, ?, ?, ?, ?, ?, ?, ?, ?",
-            row=rows
+            rows=rows
         )
@@ -1,2 +1,3 @@
 from .ethereum_bigquery import EthereumBigQuery
+from .ethereum_export import EthereumExport
 from .etherscan import Etherscan
@@ -0,0 +1,192 @@
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.parquet as pq
+
+from ..basic_utils import DatetimeUtils
+from .remote_data_source import RemoteDateSource
+
+l = logging.getLogger("transaction-trace.remote.ethereum_export")
+
+# columns of every table, in the order of the local sqlite tables
+EXPORT_COLUMNS = {
+    "traces": [
+        "transaction_hash", "transaction_index", "from_address", "to_address", "value", "input", "output",
+        "trace_type", "call_type", "reward_type", "gas", "gas_used", "subtraces", "trace_address", "error", "status",
+        "block_timestamp", "block_number", "block_hash"
+    ],
+    "blocks": [
+        "timestamp", "number", "hash", "parent_hash", "nonce", "sha3_uncles", "logs_bloom", "transactions_root",
+        "state_root", "receipts_root", "miner", "difficulty", "total_difficulty", "size", "extra_data", "gas_limit",
+        "gas_used", "transaction_count"
+    ],
+    "transactions": [
+        "hash", "nonce", "transaction_index", "from_address", "to_address", "value", "gas", "gas_price", "input",
+        "receipt_cumulative_gas_used", "receipt_gas_used", "receipt_contract_address", "receipt_root",
+        "receipt_status", "block_timestamp", "block_number", "block_hash"
+    ],
+    "token_transfers": [
+        "token_address", "from_address", "to_address", "value", "transaction_hash", "log_index", "block_timestamp",
+        "block_number", "block_hash"
+    ],
+    "contracts": [
+        "address", "bytecode", "function_sighashes", "is_erc20", "is_erc721", "block_timestamp", "block_number",
+        "block_hash"
+    ],
+    "logs": [
+        "log_index", "transaction_hash", "transaction_index", "address", "data", "topics", "block_timestamp",
+        "block_number", "block_hash"
+    ],
+}
+
+BOOLEAN_COLUMNS = ("is_erc20", "is_erc721")
+
+EXPORT_FORMATS = ("json", "csv", "parquet")
+
+
+def timestamp_column(db_name):
+    return "timestamp" if db_name == "blocks" else "block_timestamp"
+
+
+def parse_timestamp(value):
+    """
+    BigQuery exports timestamps as "YYYY-MM-DD HH:MM:SS[.ffffff] UTC" in JSON and CSV.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+
+    if value.endswith(" UTC"):
+        value = value[:-4]
+    t = datetime.fromisoformat(value)
+    return t.replace(tzinfo=timezone.utc) if t.tzinfo is None else t
+
+
+def parse_boolean(value):
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return value
+
+
+def export_format(filename):
+    name = filename[:-3] if filename.endswith(".gz") else filename
+    ext = name.rsplit(".", 1)[-1]
+    return ext if ext in EXPORT_FORMATS else None
+
+
+def read_export_file(filepath):
+    """
+    Yield the rows of an exported file as dicts.
+    """
+    fmt = export_format(filepath)
+    if fmt == "parquet":
+        yield from pq.read_table(filepath).to_pylist()
+        return
+
+    opener = gzip.open if filepath.endswith(".gz") else open
+    with opener(filepath, "rt", newline="") as f:
+        if fmt == "json":
+            for line in f:
+                if line.strip() != "":
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                # csv has no null
+                yield {k: (None if v == "" else v) for k, v in row.items()}
+
+
+def read_partition(args):
+    """
+    Read the files of an hour partition into rows in the column order of the table.
+    """
+    db_name, filepaths, from_time, to_time = args
+    columns = EXPORT_COLUMNS[db_name]
+    ts_column = timestamp_column(db_name)
+
+    rows = list()
+    for filepath in filepaths:
+        for record in read_export_file(filepath):
+            record[ts_column] = parse_timestamp(record[ts_column])
+            # partitions are hours, but do not trust the file layout for the window bounds
+            if not from_time <= record[ts_column].astimezone(timezone.utc).replace(tzinfo=None) < to_time:
+                continue
+            for column in BOOLEAN_COLUMNS:
+                if column in record:
+                    record[column] = parse_boolean(record[column])
+            rows.append(tuple(record.get(column) for column in columns))
+    return rows
+
+
+class EthereumExport(RemoteDateSource):
+    """
+    Read BigQuery exports from local disk instead of querying BigQuery.
+
+    Exports are partitioned by table, day and hour: `{export_folder}/{db_name}/YYYY-MM-DD/HH*.{json,csv,parquet}`,
+    where json is newline-delimited and json and csv files may be gzipped. An hour may be split into several files.
+    Hours are read in parallel by a process pool and returned in chronological order.
+
+    The pool is created once and reused by every window. Its workers are spawned rather than forked, since the
+    crawler reads from threads and forking a multithreaded process can copy locks held by other threads.
+    """
+
+    def __init__(self, export_folder, processes=None):
+        self.export_folder = export_folder
+        self.processes = processes if processes is not None else os.cpu_count()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __repr__(self):
+        return "ethereum export in %s" % self.export_folder
+
+    @property
+    def pool(self):
+        # created on first use, so that sources which are never read start no process
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = multiprocessing.get_context("spawn").Pool(self.processes)
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def partition_files(self, db_name, hour):
+        day_folder = os.path.join(self.export_folder, db_name, DatetimeUtils.date_to_str(hour))
+        if not os.path.isdir(day_folder):
+            return []
+
+        prefix = "%02d" % hour.hour
+        return sorted(os.path.join(day_folder, filename) for filename in os.listdir(day_folder)
+                      if filename.startswith(prefix) and export_format(filename) is not None)
+
+    def get_ethereum_data(self, from_time, to_time, db_name):
+        if db_name not in EXPORT_COLUMNS:
+            raise ValueError("unknown table %s" % db_name)
+
+        partitions = list()
+        hour = from_time.replace(minute=0, second=0, microsecond=0)
+        while hour < to_time:
+            filepaths = self.partition_files(db_name, hour)
+            if len(filepaths) > 0:
+                partitions.append((db_name, filepaths, from_time, to_time))
+            else:
+                l.warning("no export of %s for %s", db_name, DatetimeUtils.time_to_str(hour))
+            hour += timedelta(hours=1)
+
+        if len(partitions) <= 1 or self.processes <= 1:
+            for partition in partitions:
+                yield from read_partition(partition)
+            return
+
+        for rows in self.pool.imap(read_partition, partitions):
+            yield from rows
@@ -1,3 +1,9 @@
 class RemoteDateSource:
-    def get_ethereum_data(self, from_time, to_time):
+    def get_ethereum_data(self, from_time, to_time, db_name):
         raise NotImplementedError
+
+    def close(self):
+        """
+        Release the resources held by the source, e.g. worker processes.
+        """
+        pass
@@ -9,14 +9,20 @@ from transaction_trace.analysis import (ContractCentricAnalysis, PreProcess,
                                         TransactionCentricAnalysis)
 from transaction_trace.analysis.checkers import *
 from transaction_trace.analysis.intermediate_representations import Transaction
+from transaction_trace.analysis.knowledge import SensitiveAPIs
 from transaction_trace.analysis.results import AttackCandidateExporter
 
 l = logging.getLogger('analysis_pipeline')
 
 
-def main(db_folder, mysql_password, log_path, input_log_file=None):
+def main(db_folder, mysql_password, log_path, input_log_file=None, processes=1, ir_cache_folder=None,
+         signature_db=None, index_folder=None):
 
-    p = PreProcess(db_folder)
+    if signature_db is not None:
+        # compiled by samples/signature_compiler.py
+        SensitiveAPIs.load_signature_database(signature_db)
+
+    p = PreProcess(db_folder, cache_folder=ir_cache_folder)
 
     attack_candidates = open(os.path.join(log_path, "attack-candidates-%s.log" %
                                           str(time.strftime('%Y%m%d%H%M%S'))), "w+")
@@ -27,7 +33,8 @@ def main(db_folder, mysql_password, log_path, input_log_file=None):
     if input_log_file != None:
         with open(os.path.join(log_path, input_log_file), 'r') as f:
             candidates = AttackCandidateExporter.load_candidates(f)
-        cca = ContractCentricAnalysis(db_folder=db_folder, idx_db_passwd=mysql_password)
+        # index_folder holds a LocalContractTransactions index, otherwise the mysql one is used
+        cca = ContractCentricAnalysis(db_folder=db_folder, idx_db_passwd=mysql_password, index_folder=index_folder)
         cca.register_contract_centric_checker(ProfitChecker(candidate_file))
         for cand in candidates:
             cca.do_analysis(attack_candidate=cand)
@@ -43,7 +50,7 @@ def main(db_folder, mysql_password, log_path, input_log_file=None):
     # tca.register_transaction_centric_checker(TODChecker(mysql_password))
     tca.register_transaction_centric_checker(SimplifiedTODChecker())
 
-    for call_tree, result_graph in p.preprocess():
+    for call_tree, result_graph in p.preprocess(processes):
         if call_tree is None:
             continue
         tca.do_analysis(call_tree, result_graph)
@@ -0,0 +1,19 @@
+import sys
+
+import transaction_trace
+from transaction_trace.analysis import ContractCentricAnalysis, PreProcess
+
+
+def main(db_folder, index_folder, processes=1, ir_cache_folder=None):
+    # days already in the index are skipped, so running it again appends the new days
+    cca = ContractCentricAnalysis(db_folder, index_folder=index_folder)
+    cca.build_contract_transactions_index(PreProcess(db_folder, cache_folder=ir_cache_folder), processes=processes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or len(sys.argv) > 5:
+        print("Usage: python3 %s db_folder index_folder [processes] [ir_cache_folder]" % sys.argv[0])
+        exit(-1)
+
+    main(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1,
+         sys.argv[4] if len(sys.argv) > 4 else None)
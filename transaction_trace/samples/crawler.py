@@ -1,13 +1,18 @@
 import logging
 import os
+import queue
 import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from transaction_trace.basic_utils import DatetimeUtils
 from transaction_trace.local.ethereum_database import db_filename
 from transaction_trace.local.single_database import *
 from transaction_trace.remote.ethereum_bigquery import EthereumBigQuery
+from transaction_trace.remote.ethereum_export import EthereumExport
 
 l = logging.getLogger("transaction-trace.utilities.crawler")
 logger = logging.getLogger()
@@ -18,87 +23,234 @@ database_map = {
     "traces": {
         "class_name": "SingleTraceDatabase",
         "create": "create_traces_table",
-        "insert": "insert_trace"
+        "insert": "insert_trace",
+        "batch_insert": "insert_traces",
+        # indexes are dropped while a day is loaded and built once it is complete
+        "drop_index": "drop_traces_index",
+        "create_index": "create_traces_index"
     },
     "blocks": {
         "class_name": "SingleBlockDatabase",
         "create": "create_blocks_table",
-        "insert": "insert_block"
+        "insert": "insert_block",
+        "batch_insert": "insert_blocks"
     },
     "transactions": {
         "class_name": "SingleTransactionDatabase",
         "create": "create_txs_table",
-        "insert": "insert_tx"
+        "insert": "insert_tx",
+        "batch_insert": "insert_txs"
     },
     "token_transfers": {
         "class_name": "SingleTokenTransferDatabase",
         "create": "create_token_transfers_table",
-        "insert": "insert_token_transfer"
+        "insert": "insert_token_transfer",
+        "batch_insert": "insert_token_transfers"
     },
     "contracts": {
         "class_name": "SingleContractDatabase",
         "create": "create_contracts_table",
-        "insert": "insert_contract"
+        "insert": "insert_contract",
+        "batch_insert": "insert_contracts"
     },
     "logs": {
         "class_name": "SingleLogDatabase",
         "create": "create_logs_table",
-        "insert": "insert_log"
+        "insert": "insert_log",
+        "batch_insert": "insert_logs"
     }
 }
 
 
-def main(db_folder, db_name, crawl_time_path, time_interval, to_time, from_time):
-    remote = EthereumBigQuery()
-    # data insertion
-    if from_time == None:
+def open_day(db_folder, db_name, date_str):
+    db_filepath = os.path.join(db_folder, db_filename(db_name, date_str))
+    db = globals()[database_map[db_name]["class_name"]](
+        db_filepath, date_str)
+    # commits of every interval survive a crash of the crawler
+    db.begin_bulk_load(journal_mode="WAL")
+    try:
+        getattr(db, database_map[db_name]["create"])()
+    except sqlite3.Error as e:
+        print(e)
+    if "drop_index" in database_map[db_name]:
+        getattr(db, database_map[db_name]["drop_index"])()
+    return db
+
+
+def finish_day(db, db_name):
+    if "create_index" in database_map[db_name]:
+        print(f"{db_name}: create index...")
+        getattr(db, database_map[db_name]["create_index"])()
+    db.end_bulk_load()
+
+
+def crawl_windows(from_time, to_time, time_interval):
+    """
+    Time windows of `time_interval` hours, until the end of the day of `to_time`.
+    """
+    t_time = from_time + timedelta(hours=time_interval)
+    while from_time <= to_time:
+        date = from_time.date()
+        while from_time.date() == date:
+            yield from_time, t_time
+            from_time = t_time
+            t_time += timedelta(hours=time_interval)
+
+
+def fetch_with_retry(remote, from_time, t_time, db_name, retries, backoff):
+    for attempt in range(retries + 1):
         try:
-            with open(crawl_time_path, "r") as f:
-                from_time = DatetimeUtils.str_to_time(f.readline())
-        except:
-            print("crawl-time log not found, from_time need to be set")
-            exit(-1)
+            return list(remote.get_ethereum_data(from_time, t_time, db_name))
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"{db_name}: query from {from_time} to {t_time} failed ({e}), retry in {delay}s")
+            time.sleep(delay)
+
+
+def fetch_windows(remote, db_name, windows, retries, backoff, fetched, stop):
+    """
+    Fetch the windows in order into the `fetched` queue, ended by None, or by the exception which stopped fetching.
+    """
+    try:
+        for from_time, t_time in windows:
+            if stop.is_set():
+                break
+            print(f"{db_name}: query from {from_time} to {t_time}...")
+            rows = fetch_with_retry(remote, from_time, t_time, db_name, retries, backoff)
+            fetched.put((from_time, t_time, rows))
+        fetched.put(None)
+    except Exception as e:
+        fetched.put(e)
+
+
+def crawl_table(db_folder, db_name, crawl_time_path, time_interval, to_time, from_time, batch_size=10000,
+                make_remote=EthereumBigQuery, retries=5, backoff=1, prefetch=2):
+    """
+    Crawl one table, fetching the next `prefetch` windows while the current one is written to sqlite.
+    `crawl_time_path` records where to resume after each written window.
+    """
+    if from_time == None:
+        with open(crawl_time_path, "r") as f:
+            from_time = DatetimeUtils.str_to_time(f.readline())
     else:
         from_time = DatetimeUtils.str_to_date(from_time)
-    t_time = from_time + timedelta(hours=int(time_interval))
+    windows = crawl_windows(from_time, DatetimeUtils.str_to_date(to_time), int(time_interval))
 
-    while from_time <= DatetimeUtils.str_to_date(to_time):
-        date = from_time.date()
-        date_str = DatetimeUtils.date_to_str(date)
-        db_filepath = os.path.join(db_folder, db_filename(db_name, date_str))
-        db = globals()[database_map[db_name]["class_name"]](
-            db_filepath, date_str)
-        try:
-            getattr(db, database_map[db_name]["create"])()
-        except sqlite3.Error as e:
-            print(e)
+    fetched = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    remote = make_remote()
+    fetcher = threading.Thread(target=fetch_windows, args=(
+        remote, db_name, windows, retries, backoff, fetched, stop), daemon=True)
+    fetcher.start()
 
-        print(f"date:", date_str)
-        while from_time.date() == date:
+    db = None
+    try:
+        while True:
+            item = fetched.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            from_time, t_time, rows = item
 
-            print(f"query from {from_time} to {t_time}...")
-            rows = remote.get_ethereum_data(from_time, t_time, db_name)
-            count = 0
-            for row in rows:
-                getattr(db, database_map[db_name]["insert"])(row)
-                count += 1
-            print(count, "items")
+            date_str = DatetimeUtils.date_to_str(from_time.date())
+            if db is None or db.date != date_str:
+                if db is not None:
+                    finish_day(db, db_name)
+                    db.close()
+                print(f"{db_name}: date:", date_str)
+                db = open_day(db_folder, db_name, date_str)
+
+            for i in range(0, len(rows), batch_size):
+                getattr(db, database_map[db_name]["batch_insert"])(rows[i:i + batch_size])
+            print(f"{db_name}: {len(rows)} items from {from_time}")
             db.commit()
 
-            from_time = t_time
-            t_time += timedelta(hours=int(time_interval))
             with open(crawl_time_path, "w+") as f:
-                f.write(DatetimeUtils.time_to_str(from_time))
+                f.write(DatetimeUtils.time_to_str(t_time))
+
+        if db is not None:
+            finish_day(db, db_name)
+    finally:
+        stop.set()
+        # unblock the fetcher if it waits on a full queue
+        while fetcher.is_alive():
+            try:
+                fetched.get(timeout=1)
+            except queue.Empty:
+                pass
+        remote.close()
+        if db is not None:
+            db.close()
+
+
+def remote_factory(export_folder=None):
+    # read local BigQuery exports instead of querying BigQuery if given
+    if export_folder is None:
+        return lambda: EthereumBigQuery()
+    return lambda: EthereumExport(export_folder)
+
+
+def crawl_tables(db_folder, db_names, checkpoint_folder, time_interval, to_time, from_time, batch_size=10000,
+                 export_folder=None):
+    """
+    Crawl several tables concurrently, one thread per table, into `db_folder`/ethereum_{db_name}.
+    Every table resumes from its own checkpoint in `checkpoint_folder`.
+    """
+    os.makedirs(checkpoint_folder, exist_ok=True)
+    with ThreadPoolExecutor(len(db_names)) as executor:
+        futures = dict()
+        for db_name in db_names:
+            table_folder = os.path.join(db_folder, f"ethereum_{db_name}")
+            os.makedirs(table_folder, exist_ok=True)
+            crawl_time_path = os.path.join(checkpoint_folder, f"{db_name}.crawl_time")
+            if from_time == None and not os.path.exists(crawl_time_path):
+                print(f"{db_name}: crawl-time log not found, from_time need to be set")
+                continue
+            futures[db_name] = executor.submit(crawl_table, table_folder, db_name, crawl_time_path, time_interval,
+                                               to_time, from_time, batch_size, remote_factory(export_folder))
+
+        failed = False
+        for db_name, future in futures.items():
+            try:
+                future.result()
+                print(f"{db_name}: done")
+            except Exception as e:
+                failed = True
+                l.exception("failed to crawl %s: %s", db_name, e)
+    if failed:
+        exit(-1)
+
+
+def main(db_folder, db_name, crawl_time_path, time_interval, to_time, from_time, batch_size=10000, export_folder=None):
+    if from_time == None and not os.path.exists(crawl_time_path):
+        print("crawl-time log not found, from_time need to be set")
+        exit(-1)
+    crawl_table(db_folder, db_name, crawl_time_path, time_interval, to_time, from_time, batch_size,
+                remote_factory(export_folder))
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 6 or len(sys.argv) > 7:
-        print("Usage: python3 %s db_folder db_name crawl_time_path time_interval to_time [from_time]" %
+    if len(sys.argv) < 6 or len(sys.argv) > 9:
+        print("Usage: python3 %s db_folder db_name crawl_time_path time_interval to_time [from_time] [batch_size] [export_folder]" %
               sys.argv[0])
+        print("db_name may be a comma separated list or `all`, to crawl tables concurrently into db_folder/ethereum_{db_name}"
+              " with crawl_time_path as the folder of per-table checkpoints")
         exit(-1)
 
     if len(sys.argv) == 6:
         sys.argv.append(None)
+    if len(sys.argv) == 7:
+        sys.argv.append(10000)
+    if len(sys.argv) == 8:
+        sys.argv.append(None)
 
-    main(sys.argv[1], sys.argv[2], sys.argv[3],
-         sys.argv[4], sys.argv[5], sys.argv[6])
+    if sys.argv[2] == "all" or "," in sys.argv[2]:
+        db_names = list(database_map) if sys.argv[2] == "all" else sys.argv[2].split(",")
+        crawl_tables(sys.argv[1], db_names, sys.argv[3],
+                     sys.argv[4], sys.argv[5], sys.argv[6], int(sys.argv[7]), sys.argv[8])
+    else:
+        main(sys.argv[1], sys.argv[2], sys.argv[3],
+             sys.argv[4], sys.argv[5], sys.argv[6], int(sys.argv[7]), sys.argv[8])
@@ -0,0 +1,17 @@
+import sys
+
+import transaction_trace
+from transaction_trace.local import BytecodeFile, ContractCode
+
+
+def main(mysql_password, bytecode_filepath):
+    code_database = ContractCode(passwd=mysql_password)
+    BytecodeFile.write(bytecode_filepath, code_database.stream_bytecodes())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 %s mysql_password bytecode_filepath" % sys.argv[0])
+        exit(-1)
+
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,18 @@
+import sys
+
+import transaction_trace
+from transaction_trace.analysis.knowledge import SignatureDatabase
+
+
+def main(source_filepath, db_filepath):
+    db = SignatureDatabase.compile(source_filepath, db_filepath)
+    sensitive = sum(1 for _ in db.sensitive_functions())
+    print("%d signatures, %d sensitive functions" % (len(db), sensitive))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 %s signature_source db_filepath" % sys.argv[0])
+        exit(-1)
+
+    main(sys.argv[1], sys.argv[2])
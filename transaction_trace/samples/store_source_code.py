@@ -5,7 +5,7 @@ import sys
 import string
 
 import transaction_trace
-from transaction_trace.local import ContractCode, EthereumDatabase
+from transaction_trace.local import ContractCode, EthereumDatabase, LocalContractCode
 from transaction_trace.local.database_name import DatabaseName
 
 l = logging.getLogger("store_source_code")
@@ -13,7 +13,8 @@ l = logging.getLogger("store_source_code")
 
 printable = set(string.printable)
 
-def main(bytecode_db_folder, source_code_filepath, bytecode_hash_index, mysql_password, cache_len=100000):
+def main(bytecode_db_folder, source_code_filepath, bytecode_hash_index, mysql_password, cache_len=100000,
+         code_db_folder=None):
     l.info("open bytecode databases in %s", bytecode_db_folder)
     bytecode_db = EthereumDatabase(bytecode_db_folder, db_name=DatabaseName.CONTRACT_DATABASE)
 
@@ -27,7 +28,10 @@ def main(bytecode_db_folder, source_code_filepath, bytecode_hash_index, mysql_pa
         hash_contracts = dct["bytecode_hash2contracts"]
         contract_hash = dct["contract2bytecode_hash"]
 
-    dst_db = ContractCode(passwd=mysql_password)
+    if code_db_folder is not None:
+        dst_db = LocalContractCode(code_db_folder)
+    else:
+        dst_db = ContractCode(passwd=mysql_password)
     dst_db.create_tables()
     db_cache = list()
 
@@ -77,9 +81,10 @@ def main(bytecode_db_folder, source_code_filepath, bytecode_hash_index, mysql_pa
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print("Usage: python3 %s bytecode_db_folder source_code_filepath bytecode_hash_index mysql_password" %
-              sys.argv[0])
+    if len(sys.argv) not in (5, 6):
+        print("Usage: python3 %s bytecode_db_folder source_code_filepath bytecode_hash_index mysql_password "
+              "[code_db_folder]" % sys.argv[0])
         exit(-1)
 
-    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4],
+         code_db_folder=sys.argv[5] if len(sys.argv) == 6 else None)
@@ -4,14 +4,15 @@ import transaction_trace
 from transaction_trace.analysis import SubtraceBuilder
 
 
-def main(db_folder, from_time, to_time):
+def main(db_folder, from_time, to_time, processes=1, incremental=False):
     subtrace_builder = SubtraceBuilder(db_folder)
-    subtrace_builder.build_subtrace(from_time, to_time)
+    subtrace_builder.build_subtrace(from_time, to_time, processes, incremental)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python3 %s db_folder from_time to_time" % sys.argv[0])
+    if len(sys.argv) not in (4, 5, 6):
+        print("Usage: python3 %s db_folder from_time to_time [processes] [incremental]" % sys.argv[0])
         exit(-1)
 
-    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    main(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) >= 5 else 1,
+         len(sys.argv) == 6 and sys.argv[5] in ("1", "true", "incremental"))
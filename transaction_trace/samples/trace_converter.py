@@ -0,0 +1,25 @@
+import logging
+import os
+import sys
+
+import transaction_trace
+from transaction_trace.local import ColumnarTraceDatabase, DatabaseBackend, DatabaseName, EthereumDatabase
+from transaction_trace.local.ethereum_database import db_filename
+
+l = logging.getLogger("trace_converter")
+
+
+def main(db_folder, from_time, to_time, row_group_size=100000):
+    trace_db = EthereumDatabase(db_folder)
+    for conn in trace_db.get_connections(from_time, to_time):
+        db_filepath = os.path.join(db_folder, db_filename(
+            DatabaseName.TRACE_DATABASE, conn.date, DatabaseBackend.PARQUET))
+        ColumnarTraceDatabase.convert(conn, db_filepath, row_group_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python3 %s db_folder from_time to_time" % sys.argv[0])
+        exit(-1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3])